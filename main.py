@@ -1,13 +1,12 @@
 import asyncio
 from datetime import datetime
 import logging
+import multiprocessing
 import sys
 
 from async_tkinter_loop import async_mainloop
 
 from src.constants import LOG_PATH
-from src.interface.app import start_application
-from src.interface.root import rootWindow
 
 from os import environ
 from pathlib import Path
@@ -44,6 +43,12 @@ file_handler.setFormatter(file_formatter)
 root_logger.addHandler(file_handler)
 
 if __name__ == "__main__":
+    # OCR worker processes re-import this module, so they must not build the UI.
+    multiprocessing.freeze_support()
+
+    from src.interface.app import start_application
+    from src.interface.root import rootWindow
+
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
 
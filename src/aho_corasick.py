@@ -0,0 +1,74 @@
+from collections import deque
+from typing import Iterator
+
+# Text is scanned with every run of whitespace read as one space, so the
+# words of a phrase match across line breaks and repeated spaces.
+SEPARATOR = " "
+
+
+def normalize_pattern(pattern: str) -> str:
+    return SEPARATOR.join(pattern.split())
+
+
+class AhoCorasick:
+    def __init__(self, patterns: list[str]):
+        self.patterns = patterns
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._outputs: list[tuple[int, ...]] = [()]
+        for index, pattern in enumerate(patterns):
+            if pattern:
+                self._add(normalize_pattern(pattern), index)
+        self._link()
+
+    def _add(self, pattern: str, index: int) -> None:
+        state = 0
+        for char in pattern:
+            if char not in self._goto[state]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append(())
+                self._goto[state][char] = len(self._goto) - 1
+            state = self._goto[state][char]
+        self._outputs[state] += (index,)
+
+    def _link(self) -> None:
+        # Breadth first, so the failure state of a parent is always ready.
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._outputs[next_state] += self._outputs[self._fail[next_state]]
+
+    def _step(self, state: int, char: str) -> int:
+        while state and char not in self._goto[state]:
+            state = self._fail[state]
+        return self._goto[state].get(char, 0)
+
+    def scan(self, text: str) -> Iterator[tuple[int, int]]:
+        # Yields the offset of the last character of every occurrence together
+        # with the index of its pattern, in a single pass.
+        goto, outputs = self._goto, self._outputs
+        state = 0
+        in_separator = True
+        for offset, char in enumerate(text):
+            if not char.isspace():
+                in_separator = False
+            elif in_separator:
+                continue
+            else:
+                in_separator = True
+                char = SEPARATOR
+            next_state = goto[state].get(char)
+            if next_state is None:
+                # Failure transitions are remembered, turning the trie into a
+                # DFA for the characters that actually show up.
+                next_state = goto[state][char] = self._step(state, char)
+            state = next_state
+            for index in outputs[state]:
+                yield offset, index
@@ -0,0 +1,318 @@
+import argparse
+import ctypes
+import difflib
+import json
+import random
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+
+from src.constants import (
+    OCR_ENGINE,
+    OCR_FIRST_PASS_PROFILE,
+    OCR_MIN_CONFIDENCE,
+    OCR_SECOND_PASS_PROFILE,
+)
+from src.ocr import count_pdf_pages, iter_pdf_images
+from src.ocr_engines import OCR_ENGINES, create_ocr_engine
+from src.ocr_records import PageRecords, fold_text
+from src.preprocessing import PROFILES, OcrProfile, get_profile
+from src.text_searching import compile_query
+
+QUERIES = [
+    "(alva* OU MONIK) E junho E (2019 OU dois mil e dezenove)",
+    "apelação E (dano moral OU danos morais) E (*ção OU indeniza*)",
+    " OU ".join(f"termo{index}" for index in range(40)),
+    " OU ".join(f"termo{index}" for index in range(200)),
+]
+VOCABULARY = (
+    "de a o que e do da em um para com não uma os no se na por mais as dos"
+    " como mas ao ele das à seu sua ou quando muito nos já eu também só pelo"
+    " pela até isso ela entre depois sem mesmo aos seus quem nas me esse eles"
+    " processo recurso sentença juiz autor réu apelante apelado tribunal"
+    " justiça estado santa catarina decisão acórdão relator câmara civil"
+    " dano moral material indenização contrato prova pericial honorários"
+).split()
+
+
+def word_agreement(text: str, reference: str) -> float:
+    return difflib.SequenceMatcher(
+        None, text.lower().split(), reference.lower().split(), autojunk=False
+    ).ratio()
+
+
+def mean_agreement(texts: list[str], reference_texts: list[str]) -> float:
+    if not texts:
+        return 0.0
+    return statistics.fmean(
+        word_agreement(text, reference_text)
+        for text, reference_text in zip(texts, reference_texts)
+    )
+
+
+def peak_memory_bytes() -> int:
+    try:
+        import resource
+    except ImportError:  # Windows
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD),
+                ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(
+            ctypes.windll.kernel32.GetCurrentProcess(),
+            ctypes.byref(counters),
+            counters.cb,
+        )
+        return counters.PeakWorkingSetSize
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def iter_sample_pages(
+    sample_path: Path, profile: OcrProfile | None = None
+) -> Iterator[np.ndarray]:
+    for pdf_path in sorted(sample_path.glob("*.pdf")):
+        page_numbers = range(1, count_pdf_pages(pdf_path) + 1)
+        for _, image in iter_pdf_images(pdf_path, page_numbers, profile):
+            yield image
+
+
+def benchmark_profiles(sample_path: Path, reference: str = "accurate") -> None:
+    pdfs = sorted(sample_path.glob("*.pdf"))
+    if not pdfs:
+        print(f"No PDF found in {sample_path}")
+        return
+    # Load the model before timing anything.
+    engine = create_ocr_engine(OCR_ENGINE)
+
+    pages_text: dict[str, list[str]] = {}
+    pages_confidence: dict[str, list[float]] = {}
+    pages_elapsed: dict[str, list[float]] = {}
+    for name, profile in PROFILES.items():
+        pages_text[name], pages_confidence[name], pages_elapsed[name] = [], [], []
+        start = time.perf_counter()
+        for image in iter_sample_pages(sample_path, profile):
+            page = PageRecords.from_blocks(engine.read(image))
+            pages_text[name].append(page.text)
+            pages_confidence[name].append(page.confidence)
+            pages_elapsed[name].append(time.perf_counter() - start)
+            start = time.perf_counter()
+
+    # Two-pass mode is simulated from the runs above: low confidence pages of
+    # the first profile pay for the second profile too.
+    first, second = OCR_FIRST_PASS_PROFILE, OCR_SECOND_PASS_PROFILE
+    retried = [
+        confidence < OCR_MIN_CONFIDENCE for confidence in pages_confidence[first]
+    ]
+    pages_text["two-pass"] = [
+        second_text if retry else first_text
+        for first_text, second_text, retry in zip(
+            pages_text[first], pages_text[second], retried
+        )
+    ]
+    pages_elapsed["two-pass"] = [
+        first_elapsed + (second_elapsed if retry else 0.0)
+        for first_elapsed, second_elapsed, retry in zip(
+            pages_elapsed[first], pages_elapsed[second], retried
+        )
+    ]
+    elapsed = {name: sum(values) for name, values in pages_elapsed.items()}
+
+    print(f"{len(pdfs)} documents, reference profile: {reference}")
+    print(
+        f"two-pass: {first} then {second} below {OCR_MIN_CONFIDENCE:.0%}"
+        f" confidence ({sum(retried)} pages read twice)"
+    )
+    print(
+        f"{'profile':<10} {'pages':>6} {'seconds':>9} {'pages/s':>8} {'agreement':>10}"
+    )
+    for name, texts in pages_text.items():
+        agreement = mean_agreement(texts, pages_text[reference])
+        print(
+            f"{name:<10} {len(texts):>6} {elapsed[name]:>9.1f}"
+            f" {len(texts) / elapsed[name]:>8.2f} {agreement:>10.1%}"
+        )
+
+
+def sample_text(size: int, seed: int = 0) -> str:
+    generator = random.Random(seed)
+    words: list[str] = []
+    length = 0
+    while length < size:
+        line = " ".join(generator.choices(VOCABULARY, k=generator.randint(4, 14)))
+        words.append(line)
+        length += len(line) + 1
+    return "\n".join(words)
+
+
+def benchmark_queries(size_mb: float, text_path: Path | None = None) -> None:
+    text = (
+        text_path.read_text(encoding="utf-8")
+        if text_path
+        else sample_text(int(size_mb * 1024 * 1024))
+    )
+    print(f"{len(text) / 1024 / 1024:.1f} MB of text")
+    print(f"{'method':<10} {'terms':>5} {'match':>6} {'seconds':>8} {'MB/s':>7}  query")
+    for query_string in QUERIES:
+        query = compile_query(query_string)
+        folded = fold_text(text)
+        for method, search in [
+            ("regex", lambda: query.scan_regexes(folded, set(), lazy=True)),
+            ("automaton", lambda: query.scan_automaton(folded, set())),
+            ("chosen", lambda: query.search(text)),
+        ]:
+            start = time.perf_counter()
+            matched = search() is not None
+            elapsed = time.perf_counter() - start
+            print(
+                f"{method:<10} {len(query.terms):>5} {str(matched):>6}"
+                f" {elapsed:>8.3f} {len(text) / 1024 / 1024 / elapsed:>7.1f}"
+                f"  {query_string[:40]}"
+            )
+
+
+def run_engine(engine_name: str, sample_path: Path) -> dict:
+    # Rasterize first so only the OCR itself is timed.
+    images = list(iter_sample_pages(sample_path, get_profile()))
+    start = time.perf_counter()
+    engine = create_ocr_engine(engine_name)
+    loaded = time.perf_counter()
+    pages_text = [PageRecords.from_blocks(engine.read(image)).text for image in images]
+    finished = time.perf_counter()
+    return {
+        "engine": engine_name,
+        "pages": pages_text,
+        "load_seconds": loaded - start,
+        "ocr_seconds": finished - loaded,
+        "peak_memory": peak_memory_bytes(),
+    }
+
+
+def benchmark_engines(sample_path: Path, engine_names: list[str]) -> None:
+    # Each engine runs in its own process so peak memory is not shared.
+    results = []
+    for engine_name in engine_names:
+        result = subprocess.run(
+            [sys.executable, "-m", "src.benchmark", "engine-run"]
+            + [engine_name, str(sample_path)],
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            print(f"{engine_name} failed:\n{result.stderr}")
+            continue
+        results.append(json.loads(result.stdout.splitlines()[-1]))
+    if not results:
+        return
+
+    reference = results[0]
+    print(f"{len(reference['pages'])} pages, reference engine: {reference['engine']}")
+    print(
+        f"{'engine':<10} {'load s':>7} {'ocr s':>8} {'pages/s':>8}"
+        f" {'peak MB':>8} {'agreement':>10}"
+    )
+    for result in results:
+        pages = len(result["pages"])
+        agreement = mean_agreement(result["pages"], reference["pages"])
+        print(
+            f"{result['engine']:<10} {result['load_seconds']:>7.1f}"
+            f" {result['ocr_seconds']:>8.1f}"
+            f" {pages / result['ocr_seconds'] if pages else 0:>8.2f}"
+            f" {result['peak_memory'] / 1024 / 1024:>8.0f} {agreement:>10.1%}"
+        )
+
+
+def benchmark_startup(module: str = "src.interface.app", top: int = 15) -> None:
+    # Same imports main.py does before the first window is shown.
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        print(result.stderr)
+        return
+
+    imports: list[tuple[int, str]] = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        imports.append((int(cumulative), name.strip()))
+
+    print(f"import {module}: {elapsed:.2f}s wall clock (including interpreter)")
+    print(f"{'cumulative':>12}  module")
+    for cumulative, name in sorted(imports, reverse=True)[:top]:
+        print(f"{cumulative / 1000:>10.1f}ms  {name}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="TJSC robot benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    profiles_parser = commands.add_parser(
+        "profiles", help="Compare OCR preprocessing profiles on a folder of PDFs"
+    )
+    profiles_parser.add_argument("sample_path", type=Path)
+    profiles_parser.add_argument(
+        "--reference", default="accurate", choices=list(PROFILES)
+    )
+
+    engines_parser = commands.add_parser(
+        "engines", help="Compare OCR engines on a folder of PDFs"
+    )
+    engines_parser.add_argument("sample_path", type=Path)
+    engines_parser.add_argument(
+        "--engines", nargs="+", default=list(OCR_ENGINES), choices=list(OCR_ENGINES)
+    )
+
+    engine_run_parser = commands.add_parser(
+        "engine-run", help="Run a single OCR engine and print the results as JSON"
+    )
+    engine_run_parser.add_argument("engine", choices=list(OCR_ENGINES))
+    engine_run_parser.add_argument("sample_path", type=Path)
+
+    queries_parser = commands.add_parser(
+        "queries", help="Compare the query automaton with per-term regex scans"
+    )
+    queries_parser.add_argument("--size-mb", type=float, default=2.0)
+    queries_parser.add_argument("--text", type=Path, help="Search this text instead")
+
+    startup_parser = commands.add_parser(
+        "startup", help="Measure the imports done before the first window"
+    )
+    startup_parser.add_argument("--module", default="src.interface.app")
+    startup_parser.add_argument("--top", type=int, default=15)
+
+    args = parser.parse_args()
+    if args.command == "profiles":
+        benchmark_profiles(args.sample_path, args.reference)
+    elif args.command == "engines":
+        benchmark_engines(args.sample_path, args.engines)
+    elif args.command == "engine-run":
+        print(json.dumps(run_engine(args.engine, args.sample_path)))
+    elif args.command == "queries":
+        benchmark_queries(args.size_mb, args.text)
+    elif args.command == "startup":
+        benchmark_startup(args.module, args.top)
@@ -0,0 +1,43 @@
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any
+
+from src.constants import RUN_CHECKPOINT_PATH
+
+logger = logging.getLogger(__name__)
+
+
+def load_run_checkpoint(
+    parameters: dict[str, str], path: Path = RUN_CHECKPOINT_PATH
+) -> dict[str, dict[str, Any]] | None:
+    try:
+        checkpoint = json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning("Ignoring unreadable run checkpoint %s: %s", path, e)
+        return None
+    if checkpoint.get("parameters") != parameters:
+        logger.info("Run checkpoint is for other parameters, starting over")
+        return None
+    return checkpoint.get("processes") or None
+
+
+def save_run_checkpoint(
+    parameters: dict[str, str],
+    processes: dict[str, dict[str, Any]],
+    path: Path = RUN_CHECKPOINT_PATH,
+) -> None:
+    # Written aside and renamed so a crash never leaves a truncated checkpoint.
+    temporary_path = path.with_suffix(".tmp")
+    temporary_path.write_text(
+        json.dumps({"parameters": parameters, "processes": processes}),
+        encoding="utf-8",
+    )
+    os.replace(temporary_path, path)
+
+
+def clear_run_checkpoint(path: Path = RUN_CHECKPOINT_PATH) -> None:
+    path.unlink(missing_ok=True)
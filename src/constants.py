@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 import re
 
@@ -20,8 +21,16 @@ CONVERTED_PATH.mkdir(parents=True, exist_ok=True)
 DOWNLOADED_PATH = DATA_PATH / "downloaded"
 DOWNLOADED_PATH.mkdir(parents=True, exist_ok=True)
 
+CACHE_PATH = DATA_PATH / "cache"
+CACHE_PATH.mkdir(parents=True, exist_ok=True)
+
+MODELS_PATH = DATA_PATH / "models"
+MODELS_PATH.mkdir(parents=True, exist_ok=True)
+
 SECRET_PATH = DATA_PATH / "secret.json"
 STATE_PATH = DATA_PATH / "state.json"
+RUN_CHECKPOINT_PATH = DATA_PATH / "run.json"
+PINNED_FILES_PATH = DATA_PATH / "pinned.json"
 
 NAVIGATION_TIMEOUT = 8000  # millisec
 ACTION_TIMEOUT = 4000  # millisec
@@ -40,3 +49,56 @@ PIECES_DOCS_MAPS = {
     "Contra-razões": re.compile(r"contraz(ap)*\d*", re.IGNORECASE),
     "Parecer do Ministério Público": re.compile(r"promoção\d*", re.IGNORECASE),
 }
+
+# Scan at most this many pages of each piece type when searching key words.
+PIECES_MAX_PAGES_SETTINGS = {
+    "Apelação": "max_pages_apelacao",
+    "Agravo de Instrumento": "max_pages_agravo",
+    "Contra-razões": "max_pages_contrarrazoes",
+    "Parecer do Ministério Público": "max_pages_parecer",
+}
+PIECES_MAX_PAGES = {
+    piece: int(settings[key]) if settings.get(key) else None
+    for piece, key in PIECES_MAX_PAGES_SETTINGS.items()
+}
+
+OCR_LANGUAGES = ["pt"]
+OCR_POOL_SIZE = int(settings.get("ocr_pool_size", "2"))
+TEXT_LAYER_MIN_CHARS = int(settings.get("text_layer_min_chars", "32"))
+# On scanned pages the text layer may hold only the eproc signature stamp and
+# the page footer, about 350 characters, so it replaces OCR only when it holds
+# a good part of a page of text.
+SCANNED_TEXT_LAYER_MIN_CHARS = int(settings.get("scanned_text_layer_min_chars", "800"))
+SAVE_CONVERTED_IMAGES = settings.get("save_converted_images", "false").lower() == "true"
+OCR_BACKEND = settings.get("ocr_backend", "thread")  # thread | process
+OCR_WORKERS = int(settings.get("ocr_workers", str(os.cpu_count() or 1)))
+OCR_MAX_IN_FLIGHT = int(settings.get("ocr_max_in_flight", str(OCR_WORKERS * 2)))
+OCR_CONCURRENT_DOCUMENTS = int(settings.get("ocr_concurrent_documents", "4"))
+OCR_BATCH_SIZE = int(settings.get("ocr_batch_size", "4"))
+OCR_BATCH_MAX_WAIT = float(settings.get("ocr_batch_max_wait", "0.5"))  # sec
+OCR_CACHE_PATH = CACHE_PATH / "ocr.sqlite3"
+OCR_CACHE_MAX_BYTES = int(settings.get("ocr_cache_max_mb", "512")) * 1024 * 1024
+# Full-text index of every extracted page, to search again without the eproc.
+TEXT_INDEX_PATH = CACHE_PATH / "index.sqlite3"
+# fast | fast-bin | balanced | accurate
+OCR_PROFILE = settings.get("ocr_profile", "balanced")
+# A one word despacho ("Intime-se.") in 12pt is about 0.0003 of the page, one
+# line certidões about 0.0017, so only pages with less ink than that are blank.
+BLANK_PAGE_INK_RATIO = float(settings.get("blank_page_ink_ratio", "0.0001"))
+DUPLICATE_PAGE_CAPACITY = int(settings.get("duplicate_page_capacity", "5000"))
+OCR_RASTER_THREADS = int(settings.get("ocr_raster_threads", "2"))
+# Shared by all the documents being rasterized at the same time, and within
+# a document by the pages being converted and the pages waiting for OCR.
+OCR_RASTER_MEMORY_BYTES = int(settings.get("ocr_raster_memory_mb", "512")) * 1024 * 1024
+# easyocr | easyocr-onnx | easyocr-onnx-int8 | tesseract
+OCR_ENGINE = settings.get("ocr_engine", "easyocr")
+TESSERACT_CMD = settings.get("tesseract_cmd", "")
+# Two-pass OCR: every page is read with the first profile and only pages whose
+# mean confidence falls below the threshold are read again with the second.
+OCR_TWO_PASS = settings.get("ocr_two_pass", "false").lower() == "true"
+OCR_FIRST_PASS_PROFILE = settings.get("ocr_first_pass_profile", "fast")
+OCR_SECOND_PASS_PROFILE = settings.get("ocr_second_pass_profile", "accurate")
+OCR_MIN_CONFIDENCE = float(settings.get("ocr_min_confidence", "0.5"))
+# Disk budgets, the least recently used files are removed first.
+CONVERTED_MAX_BYTES = int(settings.get("converted_max_mb", "1024")) * 1024 * 1024
+DOWNLOADED_MAX_BYTES = int(settings.get("downloaded_max_mb", "4096")) * 1024 * 1024
@@ -7,6 +7,7 @@ from playwright.async_api import Page, TimeoutError
 
 from src.constants import DOMAIN, DOWNLOADED_PATH, EPROC
 from src.interface.loading import LoadingFrame
+from src.storage import get_storage
 
 
 logger = logging.getLogger(__name__)
@@ -71,13 +72,19 @@ async def download_process_files(
     file_name_pattern: re.Pattern,
     set_processes: Callable[[dict[str, dict[str, Any]]], None],
     loading_frame: LoadingFrame,
+    on_process_downloaded: Callable[[str, dict[str, Any]], None] | None = None,
 ) -> None:
     logger.debug("Downloading process files...")
     for process_number, process in processes.items():
-        logger.debug("Downloading files for process: %s", process_number)
-        if "files" not in process:
-            processes[process_number]["files"] = []
         loading_frame.update_progress()
+        if process.get("downloaded"):
+            logger.debug("Files of process %s already downloaded", process_number)
+            if on_process_downloaded:
+                on_process_downloaded(process_number, process)
+            continue
+        logger.debug("Downloading files for process: %s", process_number)
+        # Files of an interrupted download are fetched again.
+        processes[process_number]["files"] = []
         await page.goto(f"{EPROC}{process['link']}")
 
         process_folder = DOWNLOADED_PATH / process_number.replace("/", "_")
@@ -103,6 +110,11 @@ async def download_process_files(
 
             file_path = process_folder / file_name
             file_path = file_path.with_suffix(".pdf")
+            if file_path.exists():
+                logger.debug("Reusing file %s downloaded before", file_path)
+                get_storage().touch(file_path)
+                processes[process_number]["files"].append(str(file_path))
+                continue
             response = await page.request.get(
                 f"{DOMAIN}{EPROC}{parsed_url.path}", params=url_params
             )
@@ -114,12 +126,18 @@ async def download_process_files(
                     await response.body(),
                 )
                 continue
-            with open(file_path, "wb") as f:
+            # Written aside so an interrupted download is never reused.
+            temporary_path = file_path.with_suffix(".part")
+            with open(temporary_path, "wb") as f:
                 f.write(await response.body())
+            temporary_path.replace(file_path)
             downloaded_files_counter += 1
             logger.debug("Downloaded file %s to %s", file_name, file_path)
             processes[process_number]["files"].append(str(file_path))
         logger.info(
             f"Downloaded {downloaded_files_counter} files for process {process_number}."
         )
+        processes[process_number]["downloaded"] = True
+        if on_process_downloaded:
+            on_process_downloaded(process_number, processes[process_number])
     set_processes(processes)
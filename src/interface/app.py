@@ -1,6 +1,7 @@
 import logging
 import asyncio
 import tkinter as tk
+from tkinter import ttk
 from async_tkinter_loop import async_handler
 from playwright.async_api import (
     async_playwright,
@@ -25,11 +26,15 @@ from src.interface.processes_page import ProcessesPage
 from src.interface.select_parameters import ParametersPage
 from src.interface.root import rootWindow
 from src.interface.loading import LoadingFrame
+from src.ocr import ocr_warm_up, shutdown_ocr_runner
+from src.text_index import get_text_index
 
 is_navigator_ready: tk.BooleanVar = None
+ocr_status: tk.StringVar = None
 processes = DictVar()
 files = DictVar()
 loading_frame: LoadingFrame = None
+crawler_page: CrawlerPage = None
 
 playwright: Playwright = None
 browser: Browser = None
@@ -38,23 +43,42 @@ page: Page = None
 
 logger = logging.getLogger(__name__)
 
+OCR_STATUS_TEXT = {
+    "loading": "Carregando o OCR...",
+    "ready": "OCR pronto",
+    "failed": "Falha ao carregar o OCR",
+}
+
 
 def start_application():
     global is_navigator_ready
     global loading_frame
+    global ocr_status
 
     logger.debug("########## Starting application ##########")
     # Initial states
     is_navigator_ready = tk.BooleanVar(value=False)
+    ocr_status = tk.StringVar(value=OCR_STATUS_TEXT["loading"])
+
+    ocr_status_label = ttk.Label(rootWindow, textvariable=ocr_status)
+    ocr_status_label.pack(side="bottom", anchor="e", padx=10, pady=5)
 
     loading_frame = LoadingFrame(rootWindow, text="Iniciando aplicação...")
     loading_frame.pack(fill="both", expand=True)
     # Event listeners
     is_navigator_ready.trace_add("write", show_login_page)
     # rootWindow.protocol("WM_DELETE_WINDOW", async_handler(stop_navigator))
+    rootWindow.protocol("WM_DELETE_WINDOW", close_application)
 
     # Starting point
     async_handler(start_navigator)()
+    # The OCR models load while the user logs in and picks the parameters.
+    async_handler(warm_up_ocr)()
+
+
+async def warm_up_ocr():
+    await ocr_warm_up.run()
+    ocr_status.set(OCR_STATUS_TEXT[ocr_warm_up.state])
 
 
 async def start_navigator():
@@ -107,6 +131,14 @@ async def stop_navigator():
     rootWindow.destroy()
 
 
+def close_application():
+    logger.debug("Closing application...")
+    if crawler_page is not None:
+        crawler_page.cancel()
+    shutdown_ocr_runner()
+    rootWindow.destroy()
+
+
 def show_login_page(*args):
     loading_frame.destroy()
     login_frame = LoginPage(rootWindow, page, context)
@@ -117,20 +149,44 @@ def show_login_page(*args):
 def show_parameters_page(*args):
     parameters_page = ParametersPage(rootWindow, page, context)
     parameters_page.bind("<<ParametersSelected>>", show_crawler_page)
+    parameters_page.bind("<<IndexSearchSelected>>", show_index_results)
     parameters_page.pack(fill="both", expand=True)
 
 
 def show_crawler_page(e):
+    global crawler_page
+
     locator = e.widget.selected_locator.get()
     piece = e.widget.selected_piece.get()
     key_words = e.widget.selected_key_words.get()
-    crawler_page = CrawlerPage(rootWindow, page, context, locator, piece, key_words)
+    query = e.widget.compiled_query
+    crawler_page = CrawlerPage(
+        rootWindow, page, context, locator, piece, key_words, query
+    )
     crawler_page.bind("<<CrawlingFinished>>", show_processes_page)
     crawler_page.pack(fill="both", expand=True)
     async_handler(crawler_page.crawler_processes)()
 
 
+def show_index_results(e):
+    piece = e.widget.selected_piece.get() or None
+    query = e.widget.compiled_query
+    async_handler(search_text_index)(query, piece)
+
+
+async def search_text_index(query, piece):
+    loading_frame = LoadingFrame(rootWindow, text="Buscando no índice local...")
+    loading_frame.pack(fill="both", expand=True)
+    processes = await asyncio.to_thread(get_text_index().search, query, piece)
+    loading_frame.destroy()
+    processes_page = ProcessesPage(rootWindow, page, context, processes)
+    processes_page.bind("<<RestartCrawling>>", show_parameters_page)
+    processes_page.pack(fill="both", expand=True)
+
+
 def show_processes_page(*args):
-    processes_page = ProcessesPage(rootWindow, page, context)
+    processes_page = ProcessesPage(
+        rootWindow, page, context, crawler_page.run_processes
+    )
     processes_page.bind("<<RestartCrawling>>", show_parameters_page)
     processes_page.pack(fill="both", expand=True)
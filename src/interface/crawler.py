@@ -1,5 +1,6 @@
+import asyncio
 import logging
-import shutil
+from contextlib import aclosing
 from pathlib import Path
 
 import tkinter as tk
@@ -7,15 +8,39 @@ from async_tkinter_loop import async_handler
 from playwright.async_api import BrowserContext, Page
 from tkinter import ttk
 
-from src.constants import DOWNLOADED_PATH, PIECES_DOCS_MAPS
+from src.checkpoint import (
+    clear_run_checkpoint,
+    load_run_checkpoint,
+    save_run_checkpoint,
+)
+from src.constants import (
+    CONVERTED_PATH,
+    PIECES_DOCS_MAPS,
+    PIECES_MAX_PAGES,
+)
 from src.crawler.process import download_process_files, get_processes
 from src.dto import DictVar
 from src.interface.loading import LoadingFrame
-from src.ocr import extract_text_from_pdf
-from src.text_searching import find_pattern_in_text
+from src.ocr import (
+    get_page_deduplicator,
+    iter_page_records_from_pdf,
+    ocr_warm_up,
+)
+from src.ocr_cache import get_ocr_cache
+from src.scheduler import DocumentScheduler
+from src.storage import get_storage
+from src.text_index import get_text_index
+from src.text_searching import CompiledQuery, PatternMatcher
 
 logger = logging.getLogger(__name__)
 
+PROCESS_STATUS_TEXT = {
+    "queued": "Na fila",
+    "bumped": "Priorizado",
+    "found": "Encontrado",
+    "not_found": "Sem resultado",
+}
+
 
 class CrawlerPage(ttk.Frame):
     PIECES_KEYS = list(PIECES_DOCS_MAPS.keys())
@@ -28,6 +53,7 @@ class CrawlerPage(ttk.Frame):
         locator: str,
         piece: str,
         key_words: str,
+        query: CompiledQuery,
     ):
         super().__init__(parent)
         logger.debug(
@@ -41,23 +67,65 @@ class CrawlerPage(ttk.Frame):
         self.locator = locator
         self.piece = piece
         self.key_words = key_words
+        self.query = query
 
         self.processes = DictVar()
         self.files = DictVar()
         self.process_downloaded_files_trace_id = None
         self.download_files_trace_id = None
+        self.documents = DocumentScheduler()
+        self.filtering_tasks: dict[str, asyncio.Task] = {}
+        self.hit_pages: dict[str, int] = {}
+        # Updated in place while downloading and filtering, and saved after
+        # every process so an interrupted run can be resumed.
+        self.run_processes: dict[str, dict] = {}
+        self.run_parameters = {
+            "locator": locator,
+            "piece": piece,
+            "key_words": key_words,
+        }
 
         self.loading_frame: LoadingFrame = LoadingFrame(
             self, text="", mode="determinate"
         )
         self.loading_frame.pack(fill="both", expand=True)
 
+        self.queue_frame = ttk.Frame(self)
+        self.queue_tree = ttk.Treeview(
+            self.queue_frame, columns=("status",), height=8, selectmode="extended"
+        )
+        self.queue_tree.heading("#0", text="Processo")
+        self.queue_tree.heading("status", text="Situação")
+        self.queue_tree.bind("<Double-Button-1>", self.bump_selected)
+        self.queue_tree.pack(fill="both", expand=True)
+        self.bump_button = ttk.Button(
+            self.queue_frame, text="Priorizar processo", command=self.bump_selected
+        )
+        self.bump_button.pack(pady=5)
+        self.queue_frame.pack(fill="both", expand=True, padx=20, pady=10)
+
+    def set_process_status(self, process_number: str, status: str) -> None:
+        text = PROCESS_STATUS_TEXT[status]
+        if self.queue_tree.exists(process_number):
+            self.queue_tree.set(process_number, "status", text)
+        else:
+            self.queue_tree.insert(
+                "", "end", iid=process_number, text=process_number, values=(text,)
+            )
+        if status == "found":
+            # Matches are listed first as soon as they are known.
+            self.queue_tree.move(process_number, "", 0)
+
+    def bump_selected(self, *args) -> None:
+        for process_number in self.queue_tree.selection():
+            if self.queue_tree.set(process_number, "status") in (
+                PROCESS_STATUS_TEXT["queued"],
+                PROCESS_STATUS_TEXT["bumped"],
+            ):
+                self.documents.bump(process_number)
+                self.set_process_status(process_number, "bumped")
+
     async def crawler_processes(self):
-        logger.debug("Removing previous downloaded files.")
-        shutil.rmtree(
-            DOWNLOADED_PATH, ignore_errors=True
-        )  # Clean previous downloads in
-        DOWNLOADED_PATH.mkdir(parents=True, exist_ok=True)
         self.loading_frame.set_text("Coletando processos...")
         self.loading_frame.reset_progress()
         self.loading_frame.pack(fill="both", expand=True)
@@ -66,6 +134,21 @@ class CrawlerPage(ttk.Frame):
         self.download_files_trace_id = self.processes.trace_add(
             "write", async_handler(self.download_files)
         )
+        processes = load_run_checkpoint(self.run_parameters)
+        if processes:
+            logger.info(
+                "Resuming interrupted run with %d processes, %d already filtered",
+                len(processes),
+                sum(bool(process.get("filtered")) for process in processes.values()),
+            )
+            self.loading_frame.set_maximum(len(processes))
+            self.processes.set(processes)
+            return
+        # Downloads of previous runs are kept for reuse within the disk budget,
+        # only the matches of the new query are protected from eviction.
+        storage = get_storage()
+        storage.unpin_all()
+        await asyncio.to_thread(storage.enforce_all)
         await get_processes(
             self.page, self.locator, self.loading_frame, self.processes.set
         )
@@ -77,12 +160,140 @@ class CrawlerPage(ttk.Frame):
         self.process_downloaded_files_trace_id = self.processes.trace_add(
             "write", async_handler(self.process_downloaded_files)
         )
+        get_page_deduplicator().reset()
+        ocr_warm_up.attach()
+        self.run_processes = self.processes.get()
+        self.save_checkpoint()
         await download_process_files(
             self.page,
-            self.processes.get(),
+            self.run_processes,
             PIECES_DOCS_MAPS[self.piece],
             self.processes.set,
             self.loading_frame,
+            on_process_downloaded=self.schedule_process_filtering,
+        )
+
+    def save_checkpoint(self) -> None:
+        try:
+            save_run_checkpoint(self.run_parameters, self.run_processes)
+        except OSError:
+            logger.exception("Could not save the run checkpoint")
+
+    def schedule_process_filtering(self, process_number: str, process: dict) -> None:
+        # OCR starts while the remaining processes are still being downloaded.
+        if process_number not in self.filtering_tasks:
+            self.save_checkpoint()
+            self.set_process_status(process_number, "queued")
+            self.filtering_tasks[process_number] = asyncio.create_task(
+                self.filter_process_files(process_number, process)
+            )
+
+    def cancel(self) -> None:
+        for task in self.filtering_tasks.values():
+            task.cancel()
+
+    async def filter_file(self, process_number: str, file_path: str) -> bool:
+        matcher = PatternMatcher(self.query)
+        get_storage().touch(Path(file_path))
+        pages = iter_page_records_from_pdf(
+            Path(file_path), PIECES_MAX_PAGES[self.piece]
+        )
+        complete = False
+        try:
+            async with (
+                self.documents.slot(process_number, Path(file_path).stat().st_size),
+                aclosing(pages),
+            ):
+                async for page_number, page in pages:
+                    if matcher.feed(page_number, page):
+                        logger.info(
+                            "Key words found on page %d of %s, skipping the"
+                            " remaining pages",
+                            page_number,
+                            file_path,
+                        )
+                        break
+                else:
+                    complete = True
+        except Exception:
+            logger.exception("Failed to extract text from %s, keeping it", file_path)
+            return True
+        await self.index_file(process_number, file_path, matcher, complete)
+        if not await asyncio.to_thread(matcher.finish):
+            # Kept on disk, within the storage budget, for reuse by later runs.
+            logger.info("Key words not found in file %s", file_path)
+            return False
+        logger.info(
+            "Key words found in file %s on page %d at %s",
+            file_path,
+            matcher.hit.page_number,
+            matcher.hit.box,
+        )
+        self.hit_pages[file_path] = matcher.hit.page_number
+        return True
+
+    async def index_file(
+        self,
+        process_number: str,
+        file_path: str,
+        matcher: PatternMatcher,
+        complete: bool,
+    ) -> None:
+        # Whatever was extracted is kept, later queries search it locally.
+        pages = {
+            page_number: folded.text for page_number, folded in matcher.folded.items()
+        }
+        if not pages:
+            return
+        try:
+            await asyncio.to_thread(
+                get_text_index().put_document,
+                Path(file_path),
+                process_number,
+                self.piece,
+                pages,
+                complete,
+            )
+        except Exception:
+            logger.exception("Could not index the text of %s", file_path)
+
+    async def filter_process_files(self, process_number: str, process: dict) -> None:
+        if process.get("filtered"):
+            logger.debug("Files of process %s already filtered", process_number)
+            self.set_process_status(
+                process_number, "found" if process.get("files") else "not_found"
+            )
+            return
+        logger.debug("Processing files for process %s", process_number)
+        # Files may have been evicted since a resumed run downloaded them.
+        file_paths = [
+            file_path
+            for file_path in process.get("files", [])
+            if Path(file_path).exists()
+        ]
+        files_found = await asyncio.gather(
+            *(self.filter_file(process_number, file_path) for file_path in file_paths)
+        )
+        process["files"] = [
+            file_path for file_path, found in zip(file_paths, files_found) if found
+        ]
+        process["hit_pages"] = {
+            file_path: self.hit_pages[file_path]
+            for file_path in process["files"]
+            if file_path in self.hit_pages
+        }
+        for file_path in process["files"]:
+            get_storage().pin(Path(file_path))
+        process["filtered"] = True
+        self.save_checkpoint()
+        self.set_process_status(
+            process_number, "found" if process["files"] else "not_found"
+        )
+        await asyncio.to_thread(get_storage().enforce, CONVERTED_PATH)
+        logger.info(
+            "Finished with %d files for process %s after keyword filtering.",
+            sum(files_found),
+            process_number,
         )
 
     async def process_downloaded_files(self, *args) -> None:
@@ -92,21 +303,15 @@ class CrawlerPage(ttk.Frame):
 
         logger.info(self.processes.items())
         for process_number, process in self.processes.items():
+            self.schedule_process_filtering(process_number, process)
+        for task in asyncio.as_completed(self.filtering_tasks.values()):
+            await task
             self.loading_frame.update_progress()
-            file_counter = 0
-            logger.debug("Processing files for process %s", process_number)
-            for file_path in process.get("files", []):
-                file_content = await extract_text_from_pdf(Path(file_path))
-                if not find_pattern_in_text(file_content, self.key_words):
-                    logger.info("Key words not found in file %s", file_path)
-                    Path(file_path).unlink(missing_ok=True)
-                    continue
-                file_counter += 1
-                logger.info("Key words found in file %s", file_path)
-            logger.info(
-                "Finished with %d files for process %s after keyword filtering.",
-                file_counter,
-                process_number,
-            )
+        get_ocr_cache().log_stats()
+        get_text_index().log_stats()
+        storage = get_storage()
+        await asyncio.to_thread(storage.enforce_all)
+        await asyncio.to_thread(storage.log_stats)
+        clear_run_checkpoint()
         self.event_generate("<<CrawlingFinished>>")
         self.destroy()
@@ -1,4 +1,6 @@
 import os
+from pathlib import Path
+from typing import Any
 from urllib.parse import parse_qs, urlparse
 import webbrowser
 import tkinter as tk
@@ -7,11 +9,17 @@ from tkinter import ttk
 from async_tkinter_loop import async_handler
 from playwright.async_api import BrowserContext, Page
 
-from src.constants import DOMAIN, DOWNLOADED_PATH, EPROC, EPROC_CONTROLADOR
+from src.constants import DOMAIN, EPROC, EPROC_CONTROLADOR
 
 
 class ProcessesPage(ttk.LabelFrame):
-    def __init__(self, parent: tk.Tk, page: Page, context: BrowserContext):
+    def __init__(
+        self,
+        parent: tk.Tk,
+        page: Page,
+        context: BrowserContext,
+        processes: dict[str, dict[str, Any]],
+    ):
         super().__init__(parent)
         self.page = page
         self.context = context
@@ -19,26 +27,41 @@ class ProcessesPage(ttk.LabelFrame):
         self.text = "Processos Baixados"
         self.tree = ttk.Treeview(self, columns=("col1"), show="tree", cursor="hand1")
 
-        for process_number in DOWNLOADED_PATH.iterdir():
-            if process_number.is_dir() and any(process_number.glob("*.pdf")):
-                self.tree.insert(
-                    parent="",
-                    index="end",
-                    iid=process_number.name,
-                    text=process_number.name,
-                    open=True,
-                    tags=("process_button",),
-                )
-
-        for pdf_file in DOWNLOADED_PATH.glob("**/*.pdf"):
-            process_number = pdf_file.parent.name
-            file_name = pdf_file.name
+        # Only the files that matched the query, other downloads stay on disk
+        # for reuse. Matches found in the text index may have been removed
+        # from disk since, they are listed but cannot be opened.
+        for process_number, process in processes.items():
+            files = [Path(file_path) for file_path in process.get("files", [])]
+            if not files:
+                continue
             self.tree.insert(
-                parent=process_number,
+                parent="",
                 index="end",
-                text=file_name,
-                tags=("file_button",),
+                iid=process_number,
+                text=process_number,
+                open=True,
+                tags=("process_button",),
             )
+            hit_pages = process.get("hit_pages", {})
+            for pdf_file in files:
+                hit_page = hit_pages.get(str(pdf_file))
+                text = (
+                    f"{pdf_file.name} (pág. {hit_page})" if hit_page else pdf_file.name
+                )
+                if not pdf_file.exists():
+                    self.tree.insert(
+                        parent=process_number,
+                        index="end",
+                        text=f"{text} (removido do disco)",
+                    )
+                    continue
+                self.tree.insert(
+                    parent=process_number,
+                    index="end",
+                    text=text,
+                    values=(pdf_file.as_posix(),),
+                    tags=("file_button",),
+                )
 
         self.tree.tag_bind("file_button", "<Double-Button-1>", self.handle_file_click)
         self.tree.tag_bind(
@@ -55,10 +78,9 @@ class ProcessesPage(ttk.LabelFrame):
 
     def handle_file_click(self, event):
         item = self.tree.identify("item", event.x, event.y)
-        file_name = self.tree.item(item, "text")
-        process_number = self.tree.item(self.tree.parent(item), "text")
-        if file_name:
-            file_path = DOWNLOADED_PATH / process_number / file_name
+        values = self.tree.item(item, "values")
+        if values:
+            file_path = Path(values[0])
             if os.name == "nt":
                 os.startfile(file_path)  # For Windows
             elif os.name == "posix":
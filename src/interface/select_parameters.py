@@ -11,7 +11,7 @@ from src.crawler.locator import get_my_locators
 from src.dto import DictVar
 from src.interface.loading import LoadingFrame
 from src.interface.logo import LogoTitle
-from src.query_language import query
+from src.text_searching import CompiledQuery, compile_query
 
 
 logger = logging.getLogger(__name__)
@@ -31,6 +31,7 @@ class ParametersPage(ttk.Frame):
         self.selected_locator = tk.StringVar(value="")
         self.selected_piece = tk.StringVar(value=self.PIECES_KEYS[0])
         self.selected_key_words = tk.StringVar(value="")
+        self.compiled_query: CompiledQuery | None = None
 
         self.build_ui()
         self.get_user_locators()
@@ -54,6 +55,10 @@ class ParametersPage(ttk.Frame):
 
         self.button = ttk.Button(self, text="Confirmar", command=self.handle_submit)
         self.button.bind("<Return>", self.handle_submit)
+        # Searches the text of the documents of earlier runs, without the eproc.
+        self.index_button = ttk.Button(
+            self, text="Buscar no índice local", command=self.handle_index_search
+        )
 
         self.error_label = ttk.Label(
             self, text="Error ao fazer login.", foreground="red"
@@ -69,6 +74,7 @@ class ParametersPage(ttk.Frame):
         self.key_words_label.pack(pady=5)
         self.key_words_entry.pack(pady=5)
         self.button.pack(pady=5)
+        self.index_button.pack(pady=5)
 
     def hide(self):
         self.logo.pack_forget()
@@ -76,6 +82,7 @@ class ParametersPage(ttk.Frame):
         self.piece_combobox.pack_forget()
         self.key_words_entry.pack_forget()
         self.button.pack_forget()
+        self.index_button.pack_forget()
         self.error_label.pack_forget()
 
     def get_user_locators(self, *args):
@@ -94,6 +101,39 @@ class ParametersPage(ttk.Frame):
         self.show()
         logger.debug("Locators change handled.")
 
+    def show_error(self, text: str) -> None:
+        self.error_label.config(text=text)
+        self.error_label.pack(pady=5)
+
+    def compile_key_words(self, key_words: str) -> bool:
+        from pyparsing import ParseBaseException
+
+        try:
+            # Compiled once here and shared by every document of the run.
+            self.compiled_query = compile_query(key_words)
+        except ParseBaseException:
+            self.show_error("Palavras-chave inválidas.")
+            logger.error("Invalid key words provided.")
+            return False
+        return True
+
+    def handle_index_search(self, *args):
+        logger.debug("Handling local index search.")
+        self.error_label.pack_forget()
+        piece = self.selected_piece.get()
+        key_words = self.selected_key_words.get().lower()
+        if not key_words:
+            self.show_error("Por favor, preencha as palavras-chave.")
+            logger.warning("No key words provided.")
+            return
+        if not self.compile_key_words(key_words):
+            return
+        self.event_generate(
+            "<<IndexSearchSelected>>",
+            data={"piece": piece, "key_words": key_words},
+        )
+        self.destroy()
+
     def handle_submit(self, *args):
         logger.debug("Handling parameters submission.")
         self.error_label.pack_forget()
@@ -117,15 +157,8 @@ class ParametersPage(ttk.Frame):
             return
 
         self.loading_frame.pack(fill="both", expand=True)
-
-        is_key_words_valid, _ = query.run_tests(
-            key_words, print_results=False, failure_tests=False
-        )
-        if not is_key_words_valid:
+        if not self.compile_key_words(key_words):
             self.loading_frame.pack_forget()
-            self.error_label.config(text="Palavras-chave inválidas.")
-            self.error_label.pack(pady=5)
-            logger.error("Invalid key words provided.")
             return
 
         self.event_generate(
@@ -1,52 +1,805 @@
 import asyncio
 import logging
+import multiprocessing
+import os
+import queue
+import re
+import subprocess
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import aclosing, contextmanager
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Coroutine
-import easyocr
-from pdf2image import convert_from_path
-import itertools
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Iterable,
+    Iterator,
+    TypeVar,
+)
+import numpy as np
+from PIL import Image
 
-from src.constants import CONVERTED_PATH
+from src.constants import (
+    BLANK_PAGE_INK_RATIO,
+    CONVERTED_PATH,
+    DUPLICATE_PAGE_CAPACITY,
+    OCR_BACKEND,
+    OCR_BATCH_MAX_WAIT,
+    OCR_BATCH_SIZE,
+    OCR_LANGUAGES,
+    OCR_CONCURRENT_DOCUMENTS,
+    OCR_ENGINE,
+    OCR_FIRST_PASS_PROFILE,
+    OCR_MAX_IN_FLIGHT,
+    OCR_MIN_CONFIDENCE,
+    OCR_POOL_SIZE,
+    OCR_RASTER_MEMORY_BYTES,
+    OCR_RASTER_THREADS,
+    OCR_SECOND_PASS_PROFILE,
+    OCR_TWO_PASS,
+    OCR_WORKERS,
+    SAVE_CONVERTED_IMAGES,
+    SCANNED_TEXT_LAYER_MIN_CHARS,
+    TEXT_LAYER_MIN_CHARS,
+)
+from src.ocr_cache import get_ocr_cache
+from src.ocr_engines import (
+    OcrBlock,
+    OcrEngine,
+    create_ocr_engine,
+    ocr_engine_version,
+)
+from src.ocr_records import OcrDocument, PageRecords
+from src.preprocessing import (
+    OcrProfile,
+    get_profile,
+    is_blank_page,
+    page_digest,
+    preprocess_image,
+)
+from src.storage import get_storage
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
 
-def convert_pdf_to_images(pdf_path: Path) -> Path:
-    logger.debug("Converting PDF to images...")
+PAGE_SIZE_RE = re.compile(r"([\d.]+) x ([\d.]+) pts")
+A4_SIZE = (595.0, 842.0)  # pts
+SCANNED_PAGE_IMAGE_COVERAGE = 0.5  # pages mostly covered by images are scans
+
+# Bump whenever a change alters the text extracted from the same PDF.
+OCR_CACHE_VERSION = 4
+
+
+# Rasterization, preprocessing, pdftotext and the cache all block, so they run
+# here instead of on the event loop shared with Tk and Playwright.
+_blocking_executor = ThreadPoolExecutor(
+    max_workers=OCR_RASTER_THREADS, thread_name_prefix="ocr-raster"
+)
+
+
+async def run_blocking(func: Callable[..., T], *args: Any) -> T:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_blocking_executor, func, *args)
+
+
+class ThreadOcrRunner:
+    def __init__(
+        self,
+        engine_name: str = OCR_ENGINE,
+        pool_size: int = OCR_POOL_SIZE,
+        languages: list[str] = OCR_LANGUAGES,
+    ):
+        self.engine_name = engine_name
+        self.pool_size = max(1, pool_size)
+        self.max_in_flight = self.pool_size
+        self.languages = languages
+        self._engines: queue.LifoQueue[OcrEngine] = queue.LifoQueue()
+        # Pages wait for a reader in this pool, not in the default executor
+        # shared with the rest of the app, and at most pool_size engines load.
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.pool_size, thread_name_prefix="ocr-reader"
+        )
+        self._loaded = 0
+        self._lock = threading.Lock()
+
+    def _load_engine(self) -> OcrEngine:
+        # Must hold self._lock: loads are serialized so that a page arriving
+        # while another engine is loading waits for it instead of loading more.
+        self._loaded += 1
+        logger.info(
+            "Loading %s OCR model (%d of %d)...",
+            self.engine_name,
+            self._loaded,
+            self.pool_size,
+        )
+        return create_ocr_engine(self.engine_name, self.languages)
+
+    def _take_engine(self) -> OcrEngine:
+        try:
+            return self._engines.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            try:
+                return self._engines.get_nowait()
+            except queue.Empty:
+                return self._load_engine()
+
+    @contextmanager
+    def engine(self) -> Iterator[OcrEngine]:
+        engine = self._take_engine()
+        try:
+            yield engine
+        finally:
+            self._engines.put(engine)
+
+    def read_sync(self, image: np.ndarray) -> list[OcrBlock]:
+        with self.engine() as engine:
+            return engine.read(image)
+
+    def read_batch_sync(self, images: list[np.ndarray]) -> list[list[OcrBlock]]:
+        with self.engine() as engine:
+            return engine.read_batch(images)
+
+    async def read(self, image: np.ndarray) -> list[OcrBlock]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.read_sync, image)
+
+    async def read_batch(self, images: list[np.ndarray]) -> list[list[OcrBlock]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.read_batch_sync, images)
+
+    def warm_up(self) -> None:
+        with self._lock:
+            if self._loaded == 0:
+                self._engines.put(self._load_engine())
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_worker_engine: OcrEngine | None = None
+
+
+def _init_ocr_worker(engine_name: str, languages: list[str], threads: int) -> None:
+    global _worker_engine
+    logger.info("Loading %s OCR model in worker %d...", engine_name, os.getpid())
+    _worker_engine = create_ocr_engine(engine_name, languages, threads)
+
+
+def _warm_up_worker() -> None:
+    pass  # The initializer has already loaded the engine.
+
+
+def _read_in_worker(image: np.ndarray) -> list[OcrBlock]:
+    return _worker_engine.read(image)
+
+
+def _read_batch_in_worker(images: list[np.ndarray]) -> list[list[OcrBlock]]:
+    return _worker_engine.read_batch(images)
+
+
+class ProcessOcrRunner:
+    def __init__(
+        self,
+        engine_name: str = OCR_ENGINE,
+        workers: int = OCR_WORKERS,
+        max_in_flight: int = OCR_MAX_IN_FLIGHT,
+        languages: list[str] = OCR_LANGUAGES,
+    ):
+        self.engine_name = engine_name
+        self.workers = max(1, workers)
+        self.max_in_flight = max(self.workers, max_in_flight)
+        self.languages = languages
+        self._executor: ProcessPoolExecutor | None = None
+        self._in_flight = asyncio.Semaphore(self.max_in_flight)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            logger.info("Starting %d OCR worker processes...", self.workers)
+            threads = max(1, (os.cpu_count() or 1) // self.workers)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                # Forking a process that already runs Tk and Playwright is unsafe.
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_ocr_worker,
+                initargs=(self.engine_name, self.languages, threads),
+            )
+        return self._executor
+
+    async def read(self, image: np.ndarray) -> list[OcrBlock]:
+        async with self._in_flight:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._get_executor(), _read_in_worker, image
+            )
+
+    async def read_batch(self, images: list[np.ndarray]) -> list[list[OcrBlock]]:
+        async with self._in_flight:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._get_executor(), _read_batch_in_worker, images
+            )
+
+    def warm_up(self) -> None:
+        executor = self._get_executor()
+        for future in [executor.submit(_warm_up_worker) for _ in range(self.workers)]:
+            future.result()
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+class BatchingOcrRunner:
+    def __init__(
+        self,
+        runner: ThreadOcrRunner | ProcessOcrRunner,
+        batch_size: int = OCR_BATCH_SIZE,
+        max_wait: float = OCR_BATCH_MAX_WAIT,
+    ):
+        self.runner = runner
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.max_in_flight = runner.max_in_flight * batch_size
+        # Batches can only hold images of the same shape, so pages are
+        # grouped by shape and each bucket is flushed when it is full or
+        # when its oldest page has waited max_wait seconds.
+        self._buckets: dict[
+            tuple[int, ...], list[tuple[np.ndarray, asyncio.Future]]
+        ] = {}
+        self._timers: dict[tuple[int, ...], asyncio.TimerHandle] = {}
+        self._batches: set[asyncio.Task] = set()
+
+    async def read(self, image: np.ndarray) -> list[OcrBlock]:
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[list[OcrBlock]] = loop.create_future()
+        key = image.shape
+        bucket = self._buckets.setdefault(key, [])
+        bucket.append((image, future))
+        if len(bucket) >= self.batch_size:
+            self._flush(key)
+        elif len(bucket) == 1:
+            self._timers[key] = loop.call_later(self.max_wait, self._flush, key)
+        return await future
+
+    def _flush(self, key: tuple[int, ...]) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        bucket = self._buckets.pop(key, [])
+        if bucket:
+            task = asyncio.create_task(self._run_batch(bucket))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, bucket: list[tuple[np.ndarray, asyncio.Future]]) -> None:
+        bucket = [(image, future) for image, future in bucket if not future.done()]
+        if not bucket:
+            return
+        logger.debug("Running OCR batch of %d pages", len(bucket))
+        try:
+            results = await self.runner.read_batch([image for image, _ in bucket])
+        except Exception as e:
+            for _, future in bucket:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(bucket, results):
+            if not future.done():
+                future.set_result(result)
+
+    def warm_up(self) -> None:
+        self.runner.warm_up()
+
+    def shutdown(self) -> None:
+        for timer in self._timers.values():
+            timer.cancel()
+        for task in self._batches:
+            task.cancel()
+        self.runner.shutdown()
+
+
+OcrRunner = ThreadOcrRunner | ProcessOcrRunner | BatchingOcrRunner
+
+_runner: OcrRunner | None = None
+
+
+def get_ocr_runner() -> OcrRunner:
+    global _runner
+    if _runner is None:
+        if OCR_BACKEND == "process":
+            _runner = ProcessOcrRunner()
+        else:
+            _runner = ThreadOcrRunner()
+        if OCR_BATCH_SIZE > 1:
+            _runner = BatchingOcrRunner(_runner)
+    return _runner
+
+
+def shutdown_ocr_runner() -> None:
+    global _runner
+    if _runner is not None:
+        _runner.shutdown()
+        _runner = None
+
+
+class OcrWarmUp:
+    def __init__(self):
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self.failed = False
+        self._attached = False
+
+    @property
+    def state(self) -> str:
+        if self.failed:
+            return "failed"
+        if self.finished_at is not None:
+            return "ready"
+        if self.started_at is not None:
+            return "loading"
+        return "idle"
+
+    async def run(self) -> None:
+        if self.started_at is not None:
+            return
+        logger.info("Warming up the OCR engine in background...")
+        self.started_at = time.perf_counter()
+        try:
+            await asyncio.to_thread(get_ocr_runner().warm_up)
+        except Exception:
+            logger.exception("OCR engine warm-up failed")
+            self.failed = True
+            return
+        self.finished_at = time.perf_counter()
+        logger.info("OCR engine ready after %.1fs", self.finished_at - self.started_at)
+
+    def attach(self) -> None:
+        if self._attached or self.started_at is None or self.failed:
+            return
+        self._attached = True
+        saved = (self.finished_at or time.perf_counter()) - self.started_at
+        logger.info(
+            "Crawler attached to the %s OCR engine, warm-up saved %.1fs",
+            self.state,
+            saved,
+        )
+
+
+ocr_warm_up = OcrWarmUp()
+
+
+@dataclass
+class ExtractionStats:
+    text_layer_pages: int = 0
+    ocr_pages: int = 0
+    cached_pages: int = 0
+    blank_pages: int = 0
+    duplicate_pages: int = 0
+    second_pass_pages: int = 0
+
+    @property
+    def total_pages(self) -> int:
+        return self.text_layer_pages + self.ocr_pages + self.cached_pages
+
+
+def first_pass_profile() -> OcrProfile:
+    return get_profile(OCR_FIRST_PASS_PROFILE) if OCR_TWO_PASS else get_profile()
+
+
+def ocr_settings_fingerprint(profile: OcrProfile | None = None) -> str:
+    profile = profile or first_pass_profile()
+    parts = [
+        f"v{OCR_CACHE_VERSION}",
+        ocr_engine_version(OCR_ENGINE),
+        "+".join(OCR_LANGUAGES),
+        f"text-layer-{TEXT_LAYER_MIN_CHARS}-{SCANNED_TEXT_LAYER_MIN_CHARS}",
+        profile.fingerprint,
+        f"blank-{BLANK_PAGE_INK_RATIO}",
+    ]
+    if OCR_TWO_PASS:
+        second_profile = get_profile(OCR_SECOND_PASS_PROFILE)
+        parts.append(f"second-pass-{second_profile.fingerprint}-{OCR_MIN_CONFIDENCE}")
+    return ":".join(parts)
+
+
+def read_pdf_info(pdf_path: Path) -> dict[str, Any]:
+    from pdf2image import pdfinfo_from_path
+    from pdf2image.exceptions import (
+        PDFInfoNotInstalledError,
+        PDFPageCountError,
+        PDFSyntaxError,
+    )
+
+    try:
+        return pdfinfo_from_path(pdf_path)
+    except (PDFInfoNotInstalledError, PDFPageCountError, PDFSyntaxError) as e:
+        logger.warning("Could not read PDF info of %s: %s", pdf_path, e)
+        return {}
+
+
+def count_pdf_pages(pdf_path: Path) -> int:
+    from pdf2image import pdfinfo_from_path
+
+    # Unlike the page size, the page count cannot be guessed, so pdf2image
+    # errors go through instead of passing the document off as empty.
+    return int(pdfinfo_from_path(pdf_path)["Pages"])
+
+
+def read_page_size(pdf_path: Path) -> tuple[float, float]:
+    match = PAGE_SIZE_RE.match(str(read_pdf_info(pdf_path).get("Page size", "")))
+    return (float(match[1]), float(match[2])) if match else A4_SIZE
+
+
+def estimate_page_bytes(pdf_path: Path, profile: OcrProfile) -> int:
+    width, height = read_page_size(pdf_path)
+    channels = 1 if profile.grayscale else 3
+    return int(width / 72 * profile.dpi) * int(height / 72 * profile.dpi) * channels
+
+
+def raster_page_budget(pdf_path: Path, profile: OcrProfile) -> int:
+    # Pages of this document that fit in its share of the memory budget.
+    budget = OCR_RASTER_MEMORY_BYTES // max(1, OCR_CONCURRENT_DOCUMENTS)
+    return max(1, budget // estimate_page_bytes(pdf_path, profile))
+
+
+def iter_page_windows(
+    page_numbers: Iterable[int], window_size: int
+) -> Iterator[tuple[int, int]]:
+    first = last = 0
+    for page_number in page_numbers:
+        if first and page_number == last + 1 and page_number - first < window_size:
+            last = page_number
+            continue
+        if first:
+            yield first, last
+        first = last = page_number
+    if first:
+        yield first, last
+
+
+def read_text_layer(pdf_path: Path) -> list[str]:
+    # pdftotext ships with poppler, which pdf2image already requires.
+    try:
+        result = subprocess.run(
+            ["pdftotext", "-enc", "UTF-8", pdf_path.as_posix(), "-"],
+            capture_output=True,
+            check=True,
+            creationflags=subprocess.CREATE_NO_WINDOW if os.name == "nt" else 0,
+        )
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.warning("Could not read text layer of %s: %s", pdf_path, e)
+        return []
+    # Every page is terminated by a form feed, so the last chunk is empty.
+    return result.stdout.decode("utf-8", errors="replace").split("\f")[:-1]
+
+
+def read_image_coverage(pdf_path: Path) -> dict[int, float]:
+    # Part of every page covered by images, from pdfimages, also in poppler.
+    try:
+        result = subprocess.run(
+            ["pdfimages", "-list", pdf_path.as_posix()],
+            capture_output=True,
+            check=True,
+            creationflags=subprocess.CREATE_NO_WINDOW if os.name == "nt" else 0,
+        )
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.warning("Could not list images of %s: %s", pdf_path, e)
+        return {}
+    width, height = read_page_size(pdf_path)
+    page_area = width / 72 * height / 72  # square inches
+    coverage: dict[int, float] = {}
+    # Two header lines, then: page num type width height color comp bpc enc
+    # interp object ID x-ppi y-ppi size ratio.
+    for line in result.stdout.decode("utf-8", errors="replace").splitlines()[2:]:
+        fields = line.split()
+        if len(fields) < 14 or fields[2] != "image":
+            continue
+        try:
+            page_number = int(fields[0])
+            image_area = int(fields[3]) / float(fields[12])
+            image_area *= int(fields[4]) / float(fields[13])
+        except (ValueError, ZeroDivisionError):
+            continue
+        coverage[page_number] = coverage.get(page_number, 0.0) + image_area / page_area
+    return coverage
+
+
+def has_text_layer(page_text: str, image_coverage: float = 0.0) -> bool:
+    chars = len("".join(page_text.split()))
+    if image_coverage >= SCANNED_PAGE_IMAGE_COVERAGE:
+        # Scans often carry a text layer with only the signature stamp or the
+        # page footer, which must not stand for the text of the scan.
+        return chars >= SCANNED_TEXT_LAYER_MIN_CHARS
+    return chars >= TEXT_LAYER_MIN_CHARS
+
+
+def save_converted_image(pdf_path: Path, page_number: int, image: np.ndarray) -> None:
     folder_path = CONVERTED_PATH / pdf_path.parent.name / pdf_path.stem
-    folder_path.mkdir(parents=True, exist_ok=True)
-    convert_from_path(
-        pdf_path,
-        thread_count=4,
-        fmt="jpeg",
-        output_folder=folder_path,
-        output_file=pdf_path.stem,
+    image_path = folder_path / f"{pdf_path.stem}-{page_number:04d}.jpg"
+    with get_storage().writing(folder_path):
+        folder_path.mkdir(parents=True, exist_ok=True)
+        Image.fromarray(image).save(image_path, "JPEG")
+    logger.debug("Image saved at: %s", image_path)
+
+
+def iter_pdf_images(
+    pdf_path: Path,
+    page_numbers: Iterable[int],
+    profile: OcrProfile | None = None,
+    window_size: int | None = None,
+) -> Iterator[tuple[int, np.ndarray]]:
+    from pdf2image import convert_from_path
+
+    profile = profile or get_profile()
+    # Consecutive pages are converted in windows sized to the memory budget,
+    # so peak memory does not grow with the number of pages.
+    window_size = window_size or raster_page_budget(pdf_path, profile)
+    for first_page, last_page in iter_page_windows(page_numbers, window_size):
+        logger.debug(
+            "Converting pages %d-%d of %s", first_page, last_page, pdf_path.name
+        )
+        images = convert_from_path(
+            pdf_path,
+            dpi=profile.dpi,
+            grayscale=profile.grayscale,
+            first_page=first_page,
+            last_page=last_page,
+        )
+        for page_number in range(first_page, first_page + len(images)):
+            array = preprocess_image(images.pop(0), profile)
+            if SAVE_CONVERTED_IMAGES:
+                save_converted_image(pdf_path, page_number, array)
+            yield page_number, array
+
+
+def iter_ocr_inputs(
+    pdf_path: Path, page_numbers: Iterable[int], window_size: int
+) -> Iterator[tuple[int, np.ndarray | None, bytes]]:
+    for page_number, image in iter_pdf_images(
+        pdf_path, page_numbers, first_pass_profile(), window_size
+    ):
+        if is_blank_page(image):
+            yield page_number, None, b""
+        else:
+            yield page_number, image, page_digest(image)
+
+
+async def extract_records_from_image(
+    image: np.ndarray, runner: OcrRunner | None = None
+) -> PageRecords:
+    runner = runner or get_ocr_runner()
+    return PageRecords.from_blocks(await runner.read(image))
+
+
+async def extract_text_from_image(
+    image: np.ndarray, runner: OcrRunner | None = None
+) -> str:
+    return (await extract_records_from_image(image, runner)).text
+
+
+def rasterize_page(pdf_path: Path, page_number: int, profile: OcrProfile) -> np.ndarray:
+    _, image = next(iter_pdf_images(pdf_path, [page_number], profile))
+    return image
+
+
+async def read_page(
+    pdf_path: Path,
+    page_number: int,
+    image: np.ndarray,
+    runner: OcrRunner,
+    stats: ExtractionStats,
+) -> PageRecords:
+    page = await extract_records_from_image(image, runner)
+    if not OCR_TWO_PASS or page.confidence >= OCR_MIN_CONFIDENCE:
+        return page
+    logger.debug(
+        "Page %d of %s has confidence %.2f, reading it again",
+        page_number,
+        pdf_path.name,
+        page.confidence,
     )
-    logger.debug("Images saved at: %s", folder_path)
-    return folder_path
+    stats.second_pass_pages += 1
+    del image  # The low resolution raster is no longer needed.
+    image = await run_blocking(
+        rasterize_page, pdf_path, page_number, get_profile(OCR_SECOND_PASS_PROFILE)
+    )
+    return await extract_records_from_image(image, runner)
 
 
-async def extract_text_from_image(image_path: Path) -> list[str]:
-    logger.debug("Extracting text from image: %s", image_path)
-    reader = easyocr.Reader(["pt"])
-    raw = reader.readtext(image_path.as_posix(), output_format="dict")
-    result = [block["text"] for block in raw]
-    return result
+class PageDeduplicator:
+    # Only pages with the same digest share their text. Scanned copies of the
+    # same certidão never rasterize the same, but telling them apart from a
+    # copy with another date or process number would take reading them.
+    def __init__(self, capacity: int = DUPLICATE_PAGE_CAPACITY):
+        self.capacity = capacity
+        self._pages: dict[bytes, asyncio.Task[PageRecords]] = {}
 
+    def find(self, page_digest: bytes) -> asyncio.Task[PageRecords] | None:
+        return self._pages.get(page_digest)
 
-async def extract_text_from_images(folder_path: Path) -> list[list[str]]:
-    images_path: list[Coroutine[Any, Path, list[str]]] = []
-    for img_path in folder_path.glob("*.jpg"):
-        images_path.append(extract_text_from_image(img_path))
-    return await asyncio.gather(*images_path)
+    def add(self, page_digest: bytes, page: asyncio.Task[PageRecords]) -> None:
+        # Once full, the oldest pages are forgotten first.
+        if len(self._pages) >= self.capacity:
+            del self._pages[next(iter(self._pages))]
+        self._pages[page_digest] = page
 
+    def reset(self) -> None:
+        self._pages.clear()
 
-async def extract_text_from_pdf(pdf_path: Path) -> str:
+
+_deduplicator = PageDeduplicator()
+
+
+def get_page_deduplicator() -> PageDeduplicator:
+    return _deduplicator
+
+
+async def read_duplicate_page(
+    image: np.ndarray, original: asyncio.Task[PageRecords], runner: OcrRunner
+) -> PageRecords:
+    try:
+        return await asyncio.shield(original)
+    except asyncio.CancelledError:
+        if not original.cancelled():
+            raise
+    except Exception:
+        pass
+    # The first occurrence never finished, so this page is read on its own.
+    return await extract_records_from_image(image, runner)
+
+
+async def iter_ocr_pages(
+    pdf_path: Path, page_numbers: Iterable[int], stats: ExtractionStats | None = None
+) -> AsyncIterator[tuple[int, PageRecords]]:
+    runner = get_ocr_runner()
+    deduplicator = get_page_deduplicator()
+    stats = stats if stats is not None else ExtractionStats()
+    # Pages waiting for OCR and pages being converted share the memory budget
+    # of the document, half each, at least one page of each.
+    page_budget = await run_blocking(raster_page_budget, pdf_path, first_pass_profile())
+    max_in_flight = max(1, min(runner.max_in_flight, page_budget // 2))
+    pages = iter_ocr_inputs(pdf_path, page_numbers, max(1, page_budget - max_in_flight))
+    pages_left = True
+    pending: dict[asyncio.Task[PageRecords], int] = {}
+    try:
+        while True:
+            while pages_left and len(pending) < max_in_flight:
+                page = await run_blocking(next, pages, None)
+                if page is None:
+                    pages_left = False
+                    break
+                page_number, image, image_digest = page
+                if image is None:
+                    logger.debug("Skipping blank page %d of %s", page_number, pdf_path)
+                    stats.blank_pages += 1
+                    yield page_number, PageRecords.empty()
+                    continue
+                original = deduplicator.find(image_digest)
+                if original is not None:
+                    stats.duplicate_pages += 1
+                    task = asyncio.create_task(
+                        read_duplicate_page(image, original, runner)
+                    )
+                else:
+                    task = asyncio.create_task(
+                        read_page(pdf_path, page_number, image, runner, stats)
+                    )
+                    deduplicator.add(image_digest, task)
+                pending[task] = page_number
+            if not pending:
+                break
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield pending.pop(task), task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def iter_page_records_from_pdf(
+    pdf_path: Path,
+    max_pages: int | None = None,
+    stats: ExtractionStats | None = None,
+) -> AsyncIterator[tuple[int, PageRecords]]:
     logger.debug("Starting text extraction from PDF: %s", pdf_path)
-    img_path = convert_pdf_to_images(pdf_path)
-    files_text = await extract_text_from_images(img_path)
-    logger.debug("Extracted %d pages", len(files_text))
-    return "\n".join(itertools.chain.from_iterable(files_text))
+    stats = stats if stats is not None else ExtractionStats()
+    cache = get_ocr_cache()
+    cache_key = await run_blocking(
+        cache.document_key, pdf_path, ocr_settings_fingerprint()
+    )
+    page_count, cached_pages = await run_blocking(cache.get_pages, cache_key)
+    if page_count and len(cached_pages) >= page_count:
+        logger.info(
+            "OCR cache hit for %s (%d hits, %d misses)",
+            pdf_path.name,
+            cache.hits,
+            cache.misses,
+        )
+        for page_number in range(1, min(page_count, max_pages or page_count) + 1):
+            stats.cached_pages += 1
+            yield page_number, cached_pages.get(page_number, PageRecords.empty())
+        return
+
+    pages_text = await run_blocking(read_text_layer, pdf_path)
+    if not pages_text:
+        pages_text = [""] * await run_blocking(count_pdf_pages, pdf_path)
+    page_count = len(pages_text)
+    if max_pages:
+        pages_text = pages_text[:max_pages]
+    image_coverage: dict[int, float] = {}
+    if any(has_text_layer(page_text) for page_text in pages_text):
+        image_coverage = await run_blocking(read_image_coverage, pdf_path)
+
+    async def save_pages(pages: dict[int, PageRecords]) -> None:
+        # Shielded so pages read before a cancellation are still cached.
+        await asyncio.shield(
+            run_blocking(cache.put_pages, cache_key, page_count, pages)
+        )
+
+    # Pages are cached as soon as they are read, so an interrupted run resumes
+    # from the pages that have no text yet.
+    text_layer_pages: dict[int, PageRecords] = {}
+    try:
+        scanned_pages: list[int] = []
+        for page_number, page_text in enumerate(pages_text, 1):
+            if page_number in cached_pages:
+                stats.cached_pages += 1
+                yield page_number, cached_pages[page_number]
+            elif has_text_layer(page_text, image_coverage.get(page_number, 0.0)):
+                stats.text_layer_pages += 1
+                text_layer_pages[page_number] = PageRecords.from_text(page_text)
+                yield page_number, text_layer_pages[page_number]
+            else:
+                scanned_pages.append(page_number)
+        await save_pages(text_layer_pages)
+        text_layer_pages = {}
+
+        ocr_pages = iter_ocr_pages(pdf_path, scanned_pages, stats)
+        async with aclosing(ocr_pages):
+            async for page_number, page in ocr_pages:
+                stats.ocr_pages += 1
+                await save_pages({page_number: page})
+                yield page_number, page
+    finally:
+        if text_layer_pages:
+            await save_pages(text_layer_pages)
+        logger.info(
+            "Extracted %d pages from %s: %d from text layer, %d with OCR"
+            " (%d blank, %d duplicated, %d read twice), %d cached"
+            " (OCR cache: %d hits, %d misses)",
+            stats.total_pages,
+            pdf_path.name,
+            stats.text_layer_pages,
+            stats.ocr_pages,
+            stats.blank_pages,
+            stats.duplicate_pages,
+            stats.second_pass_pages,
+            stats.cached_pages,
+            cache.hits,
+            cache.misses,
+        )
+
+
+async def extract_document_from_pdf(
+    pdf_path: Path, max_pages: int | None = None
+) -> tuple[OcrDocument, ExtractionStats]:
+    stats = ExtractionStats()
+    pages = [
+        page async for page in iter_page_records_from_pdf(pdf_path, max_pages, stats)
+    ]
+    return OcrDocument(pages), stats
+
+
+async def extract_text_from_pdf(pdf_path: Path) -> str:
+    document, _ = await extract_document_from_pdf(pdf_path)
+    return document.text
 
 
 if __name__ == "__main__":
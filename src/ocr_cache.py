@@ -0,0 +1,138 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from src.constants import OCR_CACHE_MAX_BYTES, OCR_CACHE_PATH
+from src.ocr_records import PageRecords
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    key TEXT PRIMARY KEY,
+    page_count INTEGER NOT NULL,
+    size INTEGER NOT NULL DEFAULT 0,
+    last_access REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    key TEXT NOT NULL REFERENCES documents (key) ON DELETE CASCADE,
+    page_number INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    blocks BLOB,
+    PRIMARY KEY (key, page_number)
+);
+"""
+
+
+def hash_file(file_path: Path) -> str:
+    with open(file_path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+class OcrCache:
+    def __init__(
+        self, path: Path = OCR_CACHE_PATH, max_bytes: int = OCR_CACHE_MAX_BYTES
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA foreign_keys = ON")
+        self._connection.executescript(SCHEMA)
+        columns = [
+            row[1] for row in self._connection.execute("PRAGMA table_info(pages)")
+        ]
+        if "blocks" not in columns:
+            # Caches written before blocks were stored keep their text only.
+            self._connection.execute("ALTER TABLE pages ADD COLUMN blocks BLOB")
+
+    def document_key(self, pdf_path: Path, fingerprint: str) -> str:
+        return f"{hash_file(pdf_path)}:{fingerprint}"
+
+    def get_pages(self, key: str) -> tuple[int, dict[int, PageRecords]]:
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT page_count FROM documents WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return 0, {}
+            self._connection.execute(
+                "UPDATE documents SET last_access = ? WHERE key = ?",
+                (time.time(), key),
+            )
+            pages = {
+                page_number: PageRecords.from_bytes(text, blocks)
+                for page_number, text, blocks in self._connection.execute(
+                    "SELECT page_number, text, blocks FROM pages WHERE key = ?", (key,)
+                )
+            }
+        if len(pages) >= row[0]:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return row[0], pages
+
+    def put_pages(
+        self, key: str, page_count: int, pages: dict[int, PageRecords]
+    ) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT INTO documents (key, page_count, last_access) VALUES (?, ?, ?)"
+                " ON CONFLICT (key) DO UPDATE SET"
+                " page_count = excluded.page_count,"
+                " last_access = excluded.last_access",
+                (key, page_count, time.time()),
+            )
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO pages (key, page_number, text, blocks)"
+                " VALUES (?, ?, ?, ?)",
+                [
+                    (key, page_number, page.text, page.to_bytes())
+                    for page_number, page in pages.items()
+                ],
+            )
+            self._connection.execute(
+                "UPDATE documents SET size = (SELECT COALESCE(SUM("
+                "LENGTH(CAST(text AS BLOB)) + COALESCE(LENGTH(blocks), 0)), 0)"
+                " FROM pages WHERE pages.key = documents.key)"
+                " WHERE key = ?",
+                (key,),
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        (total,) = self._connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM documents"
+        ).fetchone()
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        rows = self._connection.execute(
+            "SELECT key, size FROM documents ORDER BY last_access"
+        ).fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._connection.execute("DELETE FROM documents WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        logger.info("Evicted %d documents from the OCR cache", evicted)
+
+    def log_stats(self) -> None:
+        logger.info("OCR cache: %d hits, %d misses", self.hits, self.misses)
+
+
+_cache: OcrCache | None = None
+
+
+def get_ocr_cache() -> OcrCache:
+    global _cache
+    if _cache is None:
+        _cache = OcrCache()
+    return _cache
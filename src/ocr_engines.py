@@ -0,0 +1,186 @@
+import logging
+import os
+from functools import cache
+from importlib import metadata
+from typing import Any, NamedTuple, Protocol
+
+import numpy as np
+
+from src.constants import OCR_LANGUAGES, TESSERACT_CMD
+
+logger = logging.getLogger(__name__)
+
+# easyocr language codes mapped to the tesseract traineddata names.
+TESSERACT_LANGUAGES = {"pt": "por", "en": "eng", "es": "spa"}
+
+
+# Left, top, right and bottom in pixels of the rasterized page.
+Box = tuple[int, int, int, int]
+NO_BOX: Box = (-1, -1, -1, -1)
+
+
+class OcrBlock(NamedTuple):
+    text: str
+    confidence: float
+    box: Box = NO_BOX
+
+
+class OcrEngine(Protocol):
+    name: str
+
+    def read(self, image: np.ndarray) -> list[OcrBlock]: ...
+
+    def read_batch(self, images: list[np.ndarray]) -> list[list[OcrBlock]]: ...
+
+
+class EasyOcrEngine:
+    name = "easyocr"
+
+    def __init__(self, languages: list[str] = OCR_LANGUAGES, threads: int = 0):
+        # Imported here because easyocr pulls torch in.
+        import easyocr
+
+        if threads:
+            import torch
+
+            torch.set_num_threads(threads)
+        self.reader = easyocr.Reader(languages)
+
+    @staticmethod
+    def version() -> str:
+        try:
+            return metadata.version("easyocr")
+        except metadata.PackageNotFoundError:
+            # Frozen builds may not ship the package metadata.
+            import easyocr
+
+            return easyocr.__version__
+
+    @staticmethod
+    def to_box(points: Any) -> Box:
+        xs, ys = zip(*points)
+        return int(min(xs)), int(min(ys)), int(max(xs)), int(max(ys))
+
+    @classmethod
+    def to_blocks(cls, raw: list[dict[str, Any]]) -> list[OcrBlock]:
+        return [
+            OcrBlock(
+                block["text"], float(block["confident"]), cls.to_box(block["boxes"])
+            )
+            for block in raw
+        ]
+
+    def read(self, image: np.ndarray) -> list[OcrBlock]:
+        return self.to_blocks(self.reader.readtext(image, output_format="dict"))
+
+    def read_batch(self, images: list[np.ndarray]) -> list[list[OcrBlock]]:
+        # easyocr can only batch images of the same shape.
+        raw = self.reader.readtext_batched(
+            images, batch_size=len(images), output_format="dict"
+        )
+        return [self.to_blocks(page) for page in raw]
+
+
+class OnnxEasyOcrEngine(EasyOcrEngine):
+    name = "easyocr-onnx"
+    quantize = False
+
+    def __init__(self, languages: list[str] = OCR_LANGUAGES, threads: int = 0):
+        import easyocr
+
+        from src.ocr_onnx import use_onnx_models
+
+        # torch's own dynamic quantization cannot be exported to ONNX.
+        self.reader = easyocr.Reader(languages, gpu=False, quantize=False)
+        use_onnx_models(self.reader, EasyOcrEngine.version(), self.quantize, threads)
+
+
+class QuantizedOnnxEasyOcrEngine(OnnxEasyOcrEngine):
+    name = "easyocr-onnx-int8"
+    quantize = True
+
+
+class TesseractEngine:
+    name = "tesseract"
+
+    def __init__(self, languages: list[str] = OCR_LANGUAGES, threads: int = 0):
+        import pytesseract
+
+        if TESSERACT_CMD:
+            pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+        if threads:
+            os.environ["OMP_THREAD_LIMIT"] = str(threads)
+        self.pytesseract = pytesseract
+        self.languages = "+".join(
+            TESSERACT_LANGUAGES.get(language, language) for language in languages
+        )
+
+    @staticmethod
+    def version() -> str:
+        import pytesseract
+
+        if TESSERACT_CMD:
+            pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+        return str(pytesseract.get_tesseract_version())
+
+    def read(self, image: np.ndarray) -> list[OcrBlock]:
+        data = self.pytesseract.image_to_data(
+            image, lang=self.languages, output_type=self.pytesseract.Output.DICT
+        )
+        # Words are grouped back into lines, tesseract scores them from 0 to 100.
+        lines: dict[tuple[int, int, int], list[int]] = {}
+        for index, word in enumerate(data["text"]):
+            if float(data["conf"][index]) < 0 or not word.strip():
+                continue
+            line = (
+                data["block_num"][index],
+                data["par_num"][index],
+                data["line_num"][index],
+            )
+            lines.setdefault(line, []).append(index)
+        blocks = []
+        for words in lines.values():
+            left = min(data["left"][index] for index in words)
+            top = min(data["top"][index] for index in words)
+            right = max(data["left"][index] + data["width"][index] for index in words)
+            bottom = max(data["top"][index] + data["height"][index] for index in words)
+            blocks.append(
+                OcrBlock(
+                    " ".join(data["text"][index] for index in words),
+                    sum(float(data["conf"][index]) for index in words)
+                    / len(words)
+                    / 100,
+                    (left, top, right, bottom),
+                )
+            )
+        return blocks
+
+    def read_batch(self, images: list[np.ndarray]) -> list[list[OcrBlock]]:
+        return [self.read(image) for image in images]
+
+
+OCR_ENGINES: dict[str, type[EasyOcrEngine] | type[TesseractEngine]] = {
+    EasyOcrEngine.name: EasyOcrEngine,
+    OnnxEasyOcrEngine.name: OnnxEasyOcrEngine,
+    QuantizedOnnxEasyOcrEngine.name: QuantizedOnnxEasyOcrEngine,
+    TesseractEngine.name: TesseractEngine,
+}
+
+
+def get_engine_class(name: str) -> type[EasyOcrEngine] | type[TesseractEngine]:
+    if name not in OCR_ENGINES:
+        logger.warning("Unknown OCR engine %s, using easyocr", name)
+        name = EasyOcrEngine.name
+    return OCR_ENGINES[name]
+
+
+def create_ocr_engine(
+    name: str, languages: list[str] = OCR_LANGUAGES, threads: int = 0
+) -> OcrEngine:
+    return get_engine_class(name)(languages, threads)
+
+
+@cache
+def ocr_engine_version(name: str) -> str:
+    engine_class = get_engine_class(name)
+    return f"{engine_class.name}-{engine_class.version()}"
@@ -0,0 +1,166 @@
+import logging
+import os
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable
+
+import numpy as np
+
+from src.constants import MODELS_PATH
+
+logger = logging.getLogger(__name__)
+
+ONNX_OPSET = 17
+
+
+class OnnxModel:
+    def __init__(self, path: Path, threads: int = 0):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        # Every page has its own size, and the arena would keep the buffers of
+        # each one, growing past what torch needs for the same pages.
+        options.enable_cpu_mem_arena = False
+        options.enable_mem_pattern = False
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            path.as_posix(), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+
+    def eval(self) -> "OnnxModel":
+        # easyocr calls eval() on its models before every prediction.
+        return self
+
+    def run(self, image: Any) -> list[Any]:
+        import torch
+
+        outputs = self.session.run(
+            None, {self.input_name: np.ascontiguousarray(image.cpu().numpy())}
+        )
+        return [torch.from_numpy(output) for output in outputs]
+
+
+class OnnxDetector(OnnxModel):
+    def __call__(self, image: Any) -> tuple[Any, Any]:
+        y, feature = self.run(image)
+        return y, feature
+
+
+class OnnxRecognizer(OnnxModel):
+    def __call__(self, image: Any, text: Any = None) -> Any:
+        # The text argument is only used when training the model.
+        return self.run(image)[0]
+
+
+def unwrap_model(model: Any) -> Any:
+    return getattr(model, "module", model)
+
+
+def export_detector(detector: Any, path: Path) -> None:
+    import torch
+
+    torch.onnx.export(
+        unwrap_model(detector),
+        torch.randn(1, 3, 640, 640),
+        path.as_posix(),
+        input_names=["image"],
+        output_names=["y", "feature"],
+        dynamic_axes={
+            "image": {0: "batch", 2: "height", 3: "width"},
+            "y": {0: "batch", 1: "y_height", 2: "y_width"},
+            "feature": {0: "batch", 2: "feature_height", 3: "feature_width"},
+        },
+        opset_version=ONNX_OPSET,
+        dynamo=False,
+    )
+
+
+def export_recognizer(recognizer: Any, image_height: int, path: Path) -> None:
+    import torch
+
+    class Recognizer(torch.nn.Module):
+        def __init__(self, model: Any):
+            super().__init__()
+            self.model = model
+
+        def forward(self, image: Any) -> Any:
+            # The model's forward, except that its AdaptiveAvgPool2d((None, 1))
+            # cannot be exported for images of any width, and is only a mean.
+            feature = self.model.FeatureExtraction(image).permute(0, 3, 1, 2)
+            feature = feature.mean(dim=3)
+            return self.model.Prediction(
+                self.model.SequenceModeling(feature).contiguous()
+            )
+
+    torch.onnx.export(
+        Recognizer(unwrap_model(recognizer)),
+        torch.randn(1, 1, image_height, 256),
+        path.as_posix(),
+        input_names=["image"],
+        output_names=["prediction"],
+        dynamic_axes={
+            "image": {0: "batch", 3: "width"},
+            "prediction": {0: "batch", 1: "sequence"},
+        },
+        opset_version=ONNX_OPSET,
+        dynamo=False,
+    )
+
+
+def quantize_model(path: Path, quantized_path: Path) -> None:
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    # Only the matrix products, the integer convolutions of onnxruntime are
+    # several times slower on CPU than the float ones.
+    quantize_dynamic(
+        path,
+        quantized_path,
+        op_types_to_quantize=["MatMul", "Gemm", "LSTM"],
+        weight_type=QuantType.QInt8,
+    )
+
+
+def ensure_model(path: Path, build: Callable[[Path], None]) -> Path:
+    if path.exists():
+        return path
+    logger.info("Exporting OCR model to %s...", path)
+    # Several OCR workers may export the same model at once, so each one writes
+    # its own file and the last rename wins.
+    temporary_path = path.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        build(temporary_path)
+        os.replace(temporary_path, path)
+    finally:
+        temporary_path.unlink(missing_ok=True)
+    return path
+
+
+def recognizer_height() -> int:
+    # easyocr keeps the height of the lines fed to the recognizer in a module
+    # global, which custom models overwrite, not on the Reader.
+    import easyocr.easyocr
+
+    return easyocr.easyocr.imgH
+
+
+def use_onnx_models(
+    reader: Any, version: str, quantize: bool = False, threads: int = 0
+) -> None:
+    detector_path = ensure_model(
+        MODELS_PATH / f"detector-{version}.onnx",
+        partial(export_detector, reader.detector),
+    )
+    recognizer_path = ensure_model(
+        MODELS_PATH / f"recognizer-{reader.model_lang}-{version}.onnx",
+        partial(export_recognizer, reader.recognizer, recognizer_height()),
+    )
+    if quantize:
+        # The detector is made of convolutions only and stays in float.
+        recognizer_path = ensure_model(
+            recognizer_path.with_stem(f"{recognizer_path.stem}-int8"),
+            partial(quantize_model, recognizer_path),
+        )
+    reader.detector = OnnxDetector(detector_path, threads)
+    reader.recognizer = OnnxRecognizer(recognizer_path, threads)
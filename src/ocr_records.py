@@ -0,0 +1,177 @@
+import unicodedata
+from functools import cached_property, lru_cache
+from typing import Iterable, NamedTuple
+
+import numpy as np
+
+from src.ocr_engines import NO_BOX, Box, OcrBlock
+
+# One row per text block, offsets point into the text of the page or, once
+# pages are joined in an OcrDocument, into the text of the whole document.
+BLOCK_DTYPE = np.dtype(
+    [
+        ("page", "<u4"),
+        ("start", "<u4"),
+        ("end", "<u4"),
+        ("box", "<i4", 4),
+        ("confidence", "<f4"),
+    ]
+)
+LINE_SEPARATOR = "\n"
+FOLD_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=FOLD_CACHE_SIZE)
+def fold_char(char: str) -> str:
+    # Same folding as strip_accents in old_code: "Apelação" reads "apelacao".
+    # A character may fold into none (a lone combining accent) or several
+    # (ligatures such as "ﬁ") characters.
+    decomposed = unicodedata.normalize("NFKD", char)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def fold_table(text: str) -> dict[int, str]:
+    return {ord(char): fold_char(char) for char in set(text)}
+
+
+def fold_text(text: str) -> str:
+    if text.isascii():
+        return text.lower()
+    return text.translate(fold_table(text))
+
+
+class FoldedText(NamedTuple):
+    text: str
+    # Offset in the original text of every folded character.
+    offsets: np.ndarray
+
+    @classmethod
+    def fold(cls, text: str) -> "FoldedText":
+        if text.isascii():
+            return cls(text.lower(), np.arange(len(text), dtype=np.uint32))
+        table = fold_table(text)
+        folded = text.translate(table)
+        if all(len(value) == 1 for value in table.values()):
+            return cls(folded, np.arange(len(text), dtype=np.uint32))
+        lengths = np.fromiter(
+            (len(table[ord(char)]) for char in text), dtype=np.intp, count=len(text)
+        )
+        offsets = np.repeat(np.arange(len(text), dtype=np.uint32), lengths)
+        return cls(folded, offsets)
+
+    @classmethod
+    def join(cls, parts: Iterable["FoldedText"], starts: Iterable[int]) -> "FoldedText":
+        # Joins folded pages like OcrDocument joins their text, starts being
+        # where every page begins in the original document.
+        texts: list[str] = []
+        offsets: list[np.ndarray] = []
+        for part, start in zip(parts, starts):
+            if texts:
+                separator = np.arange(start - len(LINE_SEPARATOR), start)
+                offsets.append(separator.astype(np.uint32))
+            texts.append(part.text)
+            offsets.append(part.offsets + np.uint32(start))
+        if not offsets:
+            return cls("", np.zeros(0, dtype=np.uint32))
+        return cls(LINE_SEPARATOR.join(texts), np.concatenate(offsets))
+
+    def original_offset(self, offset: int) -> int:
+        if offset < len(self.offsets):
+            return int(self.offsets[offset])
+        return int(self.offsets[-1]) + 1 if len(self.offsets) else 0
+
+
+class PageRecords(NamedTuple):
+    text: str
+    blocks: np.ndarray
+
+    @classmethod
+    def from_blocks(cls, blocks: list[OcrBlock]) -> "PageRecords":
+        records = np.zeros(len(blocks), dtype=BLOCK_DTYPE)
+        start = 0
+        for index, block in enumerate(blocks):
+            end = start + len(block.text)
+            records[index] = (0, start, end, block.box, block.confidence)
+            start = end + len(LINE_SEPARATOR)
+        return cls(LINE_SEPARATOR.join(block.text for block in blocks), records)
+
+    @classmethod
+    def from_text(cls, text: str) -> "PageRecords":
+        # Text layers have no boxes, so every line becomes a block.
+        return cls.from_blocks(
+            [OcrBlock(line, 1.0, NO_BOX) for line in text.split(LINE_SEPARATOR)]
+        )
+
+    @classmethod
+    def empty(cls) -> "PageRecords":
+        return cls("", np.zeros(0, dtype=BLOCK_DTYPE))
+
+    @classmethod
+    def from_bytes(cls, text: str, blocks: bytes | None) -> "PageRecords":
+        if blocks is None:
+            return cls.from_text(text)
+        return cls(text, np.frombuffer(blocks, dtype=BLOCK_DTYPE))
+
+    def to_bytes(self) -> bytes:
+        return self.blocks.tobytes()
+
+    @property
+    def confidence(self) -> float:
+        # Weighted by length so a stray one-letter block does not sink a page.
+        lengths = self.blocks["end"] - self.blocks["start"]
+        if not lengths.sum():
+            return 0.0
+        return float(np.average(self.blocks["confidence"], weights=lengths))
+
+
+class OcrHit(NamedTuple):
+    page_number: int
+    box: Box
+    confidence: float
+
+
+class OcrDocument:
+    def __init__(self, pages: Iterable[tuple[int, PageRecords]]):
+        texts: list[str] = []
+        blocks: list[np.ndarray] = []
+        page_numbers: list[int] = []
+        page_starts: list[int] = []
+        start = 0
+        for page_number, page in sorted(pages, key=lambda item: item[0]):
+            page_blocks = page.blocks.copy()
+            page_blocks["page"] = page_number
+            page_blocks["start"] += start
+            page_blocks["end"] += start
+            texts.append(page.text)
+            blocks.append(page_blocks)
+            page_numbers.append(page_number)
+            page_starts.append(start)
+            start += len(page.text) + len(LINE_SEPARATOR)
+        self.text = LINE_SEPARATOR.join(texts)
+        self.blocks = (
+            np.concatenate(blocks) if blocks else np.zeros(0, dtype=BLOCK_DTYPE)
+        )
+        self.page_numbers = np.array(page_numbers, dtype=np.uint32)
+        self.page_starts = np.array(page_starts, dtype=np.uint32)
+
+    @cached_property
+    def folded(self) -> FoldedText:
+        # Folded once, every query then runs on the folded text.
+        return FoldedText.fold(self.text)
+
+    def locate(self, offset: int) -> OcrHit:
+        page_index = max(0, int(np.searchsorted(self.page_starts, offset, "right")) - 1)
+        page_number = (
+            int(self.page_numbers[page_index]) if len(self.page_numbers) else 0
+        )
+        # Blocks are sorted by start, the hit is in the last block starting
+        # at or before the offset, unless it falls on a separator.
+        index = int(np.searchsorted(self.blocks["start"], offset, "right")) - 1
+        if index < 0 or offset >= self.blocks["end"][index]:
+            return OcrHit(page_number, NO_BOX, 0.0)
+        block = self.blocks[index]
+        return OcrHit(
+            int(block["page"]),
+            tuple(map(int, block["box"])),
+            float(block["confidence"]),
+        )
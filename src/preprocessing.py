@@ -0,0 +1,141 @@
+import hashlib
+import logging
+from dataclasses import dataclass
+
+import numpy as np
+from PIL import Image
+
+from src.constants import BLANK_PAGE_INK_RATIO, OCR_PROFILE
+
+logger = logging.getLogger(__name__)
+
+DESKEW_MAX_ANGLE = 5.0  # degrees
+DESKEW_STEP = 0.5  # degrees
+DESKEW_SAMPLE_SIDE = 800  # pixels
+INK_LEVEL = 128  # pixels darker than this are ink
+BLANK_PAGE_MARGIN = 0.05  # scanner borders are ignored
+PAGE_DIGEST_WIDTH = 800  # pixels, keeps the digits of a 10pt line apart
+
+
+@dataclass(frozen=True)
+class OcrProfile:
+    name: str
+    dpi: int
+    grayscale: bool
+    max_side: int | None = None
+    binarize: bool = False
+    deskew: bool = False
+
+    @property
+    def fingerprint(self) -> str:
+        return (
+            f"{self.name}-{self.dpi}dpi-{'gray' if self.grayscale else 'rgb'}"
+            f"-{self.max_side or 'full'}"
+            f"{'-bin' if self.binarize else ''}{'-deskew' if self.deskew else ''}"
+        )
+
+
+PROFILES = {
+    "fast": OcrProfile("fast", dpi=150, grayscale=True, max_side=1600),
+    # For scans with a grey or stained background, which binarizing removes.
+    "fast-bin": OcrProfile(
+        "fast-bin", dpi=150, grayscale=True, max_side=1600, binarize=True
+    ),
+    "balanced": OcrProfile("balanced", dpi=200, grayscale=True, max_side=2400),
+    "accurate": OcrProfile("accurate", dpi=300, grayscale=False, deskew=True),
+}
+
+
+def get_profile(name: str = OCR_PROFILE) -> OcrProfile:
+    if name not in PROFILES:
+        logger.warning("Unknown OCR profile %s, using balanced", name)
+        name = "balanced"
+    return PROFILES[name]
+
+
+def otsu_threshold(gray: np.ndarray) -> int:
+    histogram = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    probability = histogram / histogram.sum()
+    weight = np.cumsum(probability)
+    mean = np.cumsum(probability * np.arange(256))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        variance = (mean[-1] * weight - mean) ** 2 / (weight * (1 - weight))
+    if not np.isfinite(variance).any():
+        # A page of one color has nothing to separate.
+        return INK_LEVEL
+    return int(np.nanargmax(variance))
+
+
+def binarize(gray: np.ndarray) -> np.ndarray:
+    return np.where(gray > otsu_threshold(gray), 255, 0).astype(np.uint8)
+
+
+def estimate_skew(gray: Image.Image) -> float:
+    # Text lines are horizontal when the row sums of the ink vary the most.
+    sample = gray.copy()
+    sample.thumbnail((DESKEW_SAMPLE_SIDE, DESKEW_SAMPLE_SIDE))
+    pixels = np.asarray(sample)
+    ink_pixels = pixels < INK_LEVEL
+    if not ink_pixels.any() or ink_pixels.all():
+        # Pages without ink have no lines to straighten.
+        return 0.0
+    ink = Image.fromarray(255 - binarize(pixels))
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.arange(
+        -DESKEW_MAX_ANGLE, DESKEW_MAX_ANGLE + DESKEW_STEP, DESKEW_STEP
+    ):
+        rows = np.asarray(ink.rotate(angle, expand=True), dtype=np.float64).sum(axis=1)
+        score = float(np.var(rows))
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+
+def preprocess_image(image: Image.Image, profile: OcrProfile) -> np.ndarray:
+    if profile.grayscale and image.mode != "L":
+        image = image.convert("L")
+    if profile.max_side and max(image.size) > profile.max_side:
+        image.thumbnail((profile.max_side, profile.max_side))
+    if profile.deskew:
+        angle = estimate_skew(image.convert("L"))
+        if angle:
+            logger.debug("Deskewing page by %.1f degrees", angle)
+            image = image.rotate(
+                angle, expand=True, fillcolor=255 if image.mode == "L" else "white"
+            )
+    array = np.asarray(image)
+    if profile.binarize and array.ndim == 2:
+        array = binarize(array)
+    return array
+
+
+def to_grayscale(image: np.ndarray) -> np.ndarray:
+    if image.ndim == 2:
+        return image
+    return image[..., :3].mean(axis=2).astype(np.uint8)
+
+
+def ink_ratio(image: np.ndarray) -> float:
+    gray = to_grayscale(image)
+    height, width = gray.shape
+    margin_y = int(height * BLANK_PAGE_MARGIN)
+    margin_x = int(width * BLANK_PAGE_MARGIN)
+    content = gray[margin_y : height - margin_y, margin_x : width - margin_x]
+    if not content.size:
+        return 0.0
+    return float(np.count_nonzero(content < INK_LEVEL)) / content.size
+
+
+def is_blank_page(image: np.ndarray) -> bool:
+    return ink_ratio(image) < BLANK_PAGE_INK_RATIO
+
+
+def page_digest(image: np.ndarray) -> bytes:
+    # Exact identity of the page once downsampled and binarized, so only
+    # rasterization noise is ignored: pages differing in a single date differ.
+    gray = Image.fromarray(to_grayscale(image))
+    height = max(1, round(gray.height * PAGE_DIGEST_WIDTH / gray.width))
+    pixels = np.asarray(gray.resize((PAGE_DIGEST_WIDTH, height), Image.Resampling.BOX))
+    digest = hashlib.blake2b(np.packbits(pixels < INK_LEVEL), digest_size=16)
+    digest.update(np.array(pixels.shape, dtype=np.uint32).tobytes())
+    return digest.digest()
@@ -1,30 +1,117 @@
-from pyparsing import (
-    Forward,
-    alphanums,
-    CaselessKeyword,
-    Group,
-    Word,
-    ZeroOrMore,
-    OneOrMore,
-)
-
-connector = CaselessKeyword("E") | CaselessKeyword("OU")
-word = Word(alphanums + "_-*")
-expr = Group(word + ZeroOrMore(connector + word))
-group = Group("(" + expr + ")")
-multi_group = Forward()
-
-multi_group <<= (
-    "("
-    + (expr ^ group ^ multi_group)
-    + OneOrMore(
-        connector
-        + (group ^ multi_group)
-        + ZeroOrMore(connector + (expr ^ group ^ multi_group))
+from dataclasses import dataclass
+from functools import cache
+from typing import TYPE_CHECKING, Callable, Iterator
+
+if TYPE_CHECKING:
+    from pyparsing import ParserElement, ParseResults
+
+GRAMMAR_NAMES = ("connector", "word", "phrase", "query")
+
+
+@dataclass(frozen=True)
+class Term:
+    # Adjacent words without a connector are searched as a phrase.
+    words: tuple[str, ...]
+
+    def evaluate(self, is_present: Callable[["Term"], bool]) -> bool:
+        return is_present(self)
+
+    def terms(self) -> Iterator["Term"]:
+        yield self
+
+    def __str__(self) -> str:
+        return " ".join(self.words)
+
+
+@dataclass(frozen=True)
+class And:
+    children: tuple["QueryNode", ...]
+
+    def evaluate(self, is_present: Callable[[Term], bool]) -> bool:
+        return all(child.evaluate(is_present) for child in self.children)
+
+    def terms(self) -> Iterator[Term]:
+        for child in self.children:
+            yield from child.terms()
+
+    def __str__(self) -> str:
+        return "(" + " E ".join(map(str, self.children)) + ")"
+
+
+@dataclass(frozen=True)
+class Or:
+    children: tuple["QueryNode", ...]
+
+    def evaluate(self, is_present: Callable[[Term], bool]) -> bool:
+        return any(child.evaluate(is_present) for child in self.children)
+
+    def terms(self) -> Iterator[Term]:
+        for child in self.children:
+            yield from child.terms()
+
+    def __str__(self) -> str:
+        return "(" + " OU ".join(map(str, self.children)) + ")"
+
+
+QueryNode = Term | And | Or
+
+
+def to_term(tokens: "ParseResults") -> Term:
+    return Term(tuple(word.lower() for word in tokens))
+
+
+def to_and(tokens: "ParseResults") -> And:
+    # Operands alternate with the connectors.
+    return And(tuple(tokens[0][0::2]))
+
+
+def to_or(tokens: "ParseResults") -> Or:
+    return Or(tuple(tokens[0][0::2]))
+
+
+@cache
+def build_grammar() -> dict[str, "ParserElement"]:
+    # Built on first use: pyparsing is slow to import and to set up, and the
+    # grammar is only needed once the user submits key words.
+    from pyparsing import (
+        CaselessKeyword,
+        OneOrMore,
+        OpAssoc,
+        Regex,
+        infix_notation,
+    )
+
+    and_connector = CaselessKeyword("E")
+    or_connector = CaselessKeyword("OU")
+    connector = and_connector | or_connector
+    # \w is unicode aware, so accented words are accepted.
+    word = ~connector + Regex(r"[\w*-]+")
+    phrase = OneOrMore(word).set_parse_action(to_term)
+    # E binds tighter than OU, like the regular expressions used before.
+    query = infix_notation(
+        phrase,
+        [
+            (and_connector, 2, OpAssoc.LEFT, to_and),
+            (or_connector, 2, OpAssoc.LEFT, to_or),
+        ],
     )
-    + ")"
-)
+    return {
+        "connector": connector,
+        "word": word,
+        "phrase": phrase,
+        "query": query,
+    }
+
+
+def get_query_parser() -> "ParserElement":
+    return build_grammar()["query"]
+
+
+def parse_query(query_string: str) -> QueryNode:
+    return get_query_parser().parse_string(query_string, parse_all=True)[0]
+
 
-query = (expr ^ group ^ multi_group) + ZeroOrMore(
-    connector + (expr ^ group ^ multi_group)
-)
+def __getattr__(name: str) -> "ParserElement":
+    if name in GRAMMAR_NAMES:
+        return build_grammar()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,69 @@
+import asyncio
+import heapq
+import itertools
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from src.constants import OCR_CONCURRENT_DOCUMENTS
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentScheduler:
+    # Documents wait for one of the slots in priority order: documents of
+    # bumped processes first, then the smaller ones, which find a hit sooner.
+    def __init__(self, slots: int = OCR_CONCURRENT_DOCUMENTS):
+        self.slots = max(1, slots)
+        self._waiting: list[list] = []
+        self._sequence = itertools.count()
+        self._bumped: set[str] = set()
+
+    def _priority(self, process_number: str, size: int) -> tuple[int, int]:
+        return (0 if process_number in self._bumped else 1, size)
+
+    def bump(self, process_number: str) -> None:
+        logger.info("Moving process %s to the front of the OCR queue", process_number)
+        self._bumped.add(process_number)
+        for entry in self._waiting:
+            if entry[2] == process_number:
+                entry[0] = self._priority(process_number, entry[3])
+        heapq.heapify(self._waiting)
+
+    def _release(self) -> None:
+        while self._waiting:
+            *_, future = heapq.heappop(self._waiting)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.slots += 1
+
+    @asynccontextmanager
+    async def slot(self, process_number: str, size: int) -> AsyncIterator[None]:
+        # Slots are only freed when nobody is waiting, so a free slot is taken
+        # right away.
+        if self.slots:
+            self.slots -= 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(
+                self._waiting,
+                [
+                    self._priority(process_number, size),
+                    next(self._sequence),
+                    process_number,
+                    size,
+                    future,
+                ],
+            )
+            try:
+                await future
+            except asyncio.CancelledError:
+                # The slot may have been handed over right before the cancel.
+                if future.done() and not future.cancelled():
+                    self._release()
+                raise
+        try:
+            yield
+        finally:
+            self._release()
@@ -0,0 +1,238 @@
+import json
+import logging
+import os
+import stat
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator
+
+from src.constants import (
+    CONVERTED_MAX_BYTES,
+    CONVERTED_PATH,
+    DATA_PATH,
+    DOWNLOADED_MAX_BYTES,
+    DOWNLOADED_PATH,
+    PINNED_FILES_PATH,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ProcessUsage:
+    downloaded_files: int = 0
+    downloaded_bytes: int = 0
+    converted_files: int = 0
+    converted_bytes: int = 0
+
+    @property
+    def total_bytes(self) -> int:
+        return self.downloaded_bytes + self.converted_bytes
+
+
+def last_access(file_stat: os.stat_result) -> float:
+    # Many file systems do not update atime, so accesses also touch mtime.
+    return max(file_stat.st_atime, file_stat.st_mtime)
+
+
+def iter_files(directory: Path) -> Iterator[tuple[Path, os.stat_result]]:
+    # Files may be removed while the tree is walked, they are just skipped.
+    for folder, _, file_names in os.walk(directory):
+        for file_name in file_names:
+            file_path = Path(folder) / file_name
+            try:
+                file_stat = file_path.stat()
+            except FileNotFoundError:
+                continue
+            if stat.S_ISREG(file_stat.st_mode):
+                yield file_path, file_stat
+
+
+class StorageManager:
+    def __init__(
+        self,
+        quotas: dict[Path, int] | None = None,
+        pins_path: Path = PINNED_FILES_PATH,
+    ):
+        self.quotas = quotas or {
+            DOWNLOADED_PATH: DOWNLOADED_MAX_BYTES,
+            CONVERTED_PATH: CONVERTED_MAX_BYTES,
+        }
+        self.pins_path = pins_path
+        self._lock = threading.Lock()
+        self._writing: Counter[Path] = Counter()
+        try:
+            self._pins = set(json.loads(pins_path.read_text(encoding="utf-8")))
+        except FileNotFoundError:
+            self._pins = set()
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable pinned files %s: %s", pins_path, e)
+            self._pins = set()
+
+    @staticmethod
+    def document_key(file_path: Path) -> str:
+        # Converted images live in converted/<process>/<document>/, so they
+        # share the key of downloaded/<process>/<document>.pdf.
+        file_path = file_path.resolve()
+        converted_path = CONVERTED_PATH.resolve()
+        if file_path.is_relative_to(converted_path):
+            process, document = file_path.relative_to(converted_path).parts[:2]
+            return f"{process}/{document}"
+        return f"{file_path.parent.name}/{file_path.stem}"
+
+    def _save_pins(self) -> None:
+        temporary_path = self.pins_path.with_suffix(".tmp")
+        temporary_path.write_text(json.dumps(sorted(self._pins)), encoding="utf-8")
+        os.replace(temporary_path, self.pins_path)
+
+    def pin(self, file_path: Path) -> None:
+        with self._lock:
+            self._pins.add(self.document_key(file_path))
+            self._save_pins()
+
+    def unpin_all(self) -> None:
+        with self._lock:
+            self._pins.clear()
+            self._save_pins()
+
+    def is_pinned(self, file_path: Path) -> bool:
+        return self.document_key(file_path) in self._pins
+
+    def touch(self, file_path: Path) -> None:
+        try:
+            os.utime(file_path)
+        except FileNotFoundError:
+            pass
+
+    @contextmanager
+    def writing(self, folder_path: Path) -> Iterator[None]:
+        # Folders being written are not removed while they are still empty.
+        folder_path = folder_path.resolve()
+        with self._lock:
+            self._writing[folder_path] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._writing[folder_path] -= 1
+                if not self._writing[folder_path]:
+                    del self._writing[folder_path]
+
+    def usage(self, directory: Path) -> int:
+        return sum(file_stat.st_size for _, file_stat in iter_files(directory))
+
+    def _remove_empty_folders(self, directory: Path) -> None:
+        for folder, _, _ in os.walk(directory, topdown=False):
+            folder_path = Path(folder).resolve()
+            if folder_path == directory.resolve() or any(
+                path.is_relative_to(folder_path) for path in self._writing
+            ):
+                continue
+            try:
+                folder_path.rmdir()
+            except OSError:
+                pass  # Not empty.
+
+    def enforce(self, directory: Path) -> int:
+        # Runs from several threads as processes finish, so the whole pass
+        # holds the lock.
+        with self._lock:
+            return self._enforce(directory)
+
+    def _enforce(self, directory: Path) -> int:
+        max_bytes = self.quotas[directory]
+        files = [
+            (last_access(file_stat), file_stat.st_size, file_path)
+            for file_path, file_stat in iter_files(directory)
+        ]
+        total = sum(size for _, size, _ in files)
+        if total <= max_bytes:
+            return 0
+        freed = evicted = 0
+        for _, size, file_path in sorted(files):
+            if total - freed <= max_bytes:
+                break
+            if self.is_pinned(file_path):
+                continue
+            try:
+                file_path.unlink(missing_ok=True)
+            except OSError as e:
+                # On Windows a PDF the user has open cannot be removed.
+                logger.warning("Could not evict %s: %s", file_path, e)
+                continue
+            freed += size
+            evicted += 1
+        self._remove_empty_folders(directory)
+        logger.info(
+            "Evicted %d files (%.1f MB) from %s",
+            evicted,
+            freed / 1024 / 1024,
+            directory,
+        )
+        if total - freed > max_bytes:
+            logger.warning(
+                "%s uses %.1f MB in pinned files, over its %.1f MB budget",
+                directory,
+                (total - freed) / 1024 / 1024,
+                max_bytes / 1024 / 1024,
+            )
+        return freed
+
+    def enforce_all(self) -> int:
+        return sum(self.enforce(directory) for directory in self.quotas)
+
+    def process_usage(self) -> dict[str, ProcessUsage]:
+        usage: dict[str, ProcessUsage] = {}
+        for file_path, file_stat in iter_files(DOWNLOADED_PATH):
+            process_usage = usage.setdefault(file_path.parent.name, ProcessUsage())
+            process_usage.downloaded_files += 1
+            process_usage.downloaded_bytes += file_stat.st_size
+        for file_path, file_stat in iter_files(CONVERTED_PATH):
+            process_usage = usage.setdefault(
+                file_path.parent.parent.name, ProcessUsage()
+            )
+            process_usage.converted_files += 1
+            process_usage.converted_bytes += file_stat.st_size
+        return usage
+
+    def report(self) -> str:
+        lines = [
+            f"{directory.relative_to(DATA_PATH)}:"
+            f" {self.usage(directory) / 1024 / 1024:.1f}"
+            f" of {max_bytes / 1024 / 1024:.0f} MB"
+            for directory, max_bytes in self.quotas.items()
+        ]
+        lines.append(
+            f"{'process':<30} {'pdfs':>5} {'pdf MB':>8} {'images':>7} {'image MB':>9}"
+        )
+        usage = self.process_usage()
+        for process, process_usage in sorted(
+            usage.items(), key=lambda item: item[1].total_bytes, reverse=True
+        ):
+            lines.append(
+                f"{process:<30} {process_usage.downloaded_files:>5}"
+                f" {process_usage.downloaded_bytes / 1024 / 1024:>8.1f}"
+                f" {process_usage.converted_files:>7}"
+                f" {process_usage.converted_bytes / 1024 / 1024:>9.1f}"
+            )
+        return "\n".join(lines)
+
+    def log_stats(self) -> None:
+        logger.info("Storage usage:\n%s", self.report())
+
+
+_storage: StorageManager | None = None
+
+
+def get_storage() -> StorageManager:
+    global _storage
+    if _storage is None:
+        _storage = StorageManager()
+    return _storage
+
+
+if __name__ == "__main__":
+    print(get_storage().report())
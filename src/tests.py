@@ -1,6 +1,7 @@
 import itertools
 
-from query_language import query, expr, group, multi_group
+from src.query_language import query
+from src.text_searching import CompiledQuery
 
 expressions = [
     "palavra1",
@@ -36,3 +37,32 @@ everything = itertools.chain(
 query.run_tests(
     [*expressions, *groups, *multi_groups, *[" e ".join(e) for e in everything]]
 )
+
+# Query, text, whether the text matches. Terms match anywhere in the folded
+# text, a * only marks that a word may go on.
+matches = [
+    ("monik", "Monike da Silva", True),
+    ("2019", "processo 20190001", True),
+    ("alva*", "Álvaro", True),
+    ("alva*", "Alice", False),
+    ("*ção", "APELAÇÃO CÍVEL", True),
+    ("indeniza*", "indenizações", True),
+    ("dano moral", "dano\n   moral", True),
+    ("dano moral", "dano, moral", False),
+    ("dano moral", "moral dano", False),
+    ("apelacao", "Recurso de Apelação", True),
+    ("apelação", "apelacao", True),
+    ("contra-razões", "CONTRA-RAZÕES", True),
+    ("junho E 2019", "2019 e depois junho", True),
+    ("junho E 2019", "junho de 2020", False),
+    ("junho OU 2019", "2019", True),
+    ("a E b OU c", "c", True),
+    ("a E (b OU c)", "c", False),
+    ("junho e (dois mil e dezenove OU 2019)", "junho de dois mil e dezenove", True),
+    ("*", "", True),
+]
+for query_string, text, expected in matches:
+    compiled = CompiledQuery(query_string)
+    for use_automaton in (False, True):
+        compiled.use_automaton = use_automaton
+        assert compiled.matches(text) is expected, (query_string, text, use_automaton)
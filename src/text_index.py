@@ -0,0 +1,207 @@
+import logging
+import re
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+from src.constants import TEXT_INDEX_PATH
+from src.ocr_records import PageRecords
+from src.query_language import And, QueryNode, Term
+from src.text_searching import CompiledQuery, PatternMatcher, compile_query
+
+logger = logging.getLogger(__name__)
+
+# Pages are stored folded. Terms match inside words, so pages are indexed by
+# trigrams, which find any substring of at least three characters.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    file_path TEXT NOT NULL UNIQUE,
+    file_name TEXT NOT NULL,
+    process_number TEXT NOT NULL,
+    piece TEXT NOT NULL,
+    complete INTEGER NOT NULL DEFAULT 0,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    id INTEGER PRIMARY KEY,
+    document_id INTEGER NOT NULL REFERENCES documents (id) ON DELETE CASCADE,
+    page_number INTEGER NOT NULL,
+    UNIQUE (document_id, page_number)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS page_text USING fts5(
+    text, tokenize = "trigram"
+);
+"""
+
+
+TRIGRAM_MIN_CHARS = 3
+WORD_PIECE = re.compile(r"\w+")
+
+
+class TextIndex:
+    def __init__(self, path: Path = TEXT_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA foreign_keys = ON")
+        row = self._connection.execute(
+            "SELECT sql FROM sqlite_master WHERE name = 'page_text'"
+        ).fetchone()
+        if row and "trigram" not in row[0]:
+            # Indexes of whole words cannot find terms inside words, the
+            # documents are indexed again as they are read.
+            logger.info("Rebuilding the text index with trigrams")
+            self._connection.executescript(
+                "DROP TABLE page_text; DROP TABLE pages; DROP TABLE documents;"
+            )
+        self._connection.executescript(SCHEMA)
+
+    def put_document(
+        self,
+        file_path: Path,
+        process_number: str,
+        piece: str,
+        pages: dict[int, str],
+        complete: bool,
+    ) -> None:
+        # Pages come folded. Pages indexed by an earlier run stay, so a run
+        # stopping at the first hit does not drop the pages read before.
+        with self._lock, self._connection:
+            (document_id,) = self._connection.execute(
+                "INSERT INTO documents"
+                " (file_path, file_name, process_number, piece, complete, indexed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (file_path) DO UPDATE SET"
+                " process_number = excluded.process_number,"
+                " piece = excluded.piece,"
+                " complete = MAX(complete, excluded.complete),"
+                " indexed_at = excluded.indexed_at"
+                " RETURNING id",
+                (
+                    file_path.as_posix(),
+                    file_path.name,
+                    process_number,
+                    piece,
+                    complete,
+                    time.time(),
+                ),
+            ).fetchone()
+            for page_number, text in pages.items():
+                (page_id,) = self._connection.execute(
+                    "INSERT INTO pages (document_id, page_number) VALUES (?, ?)"
+                    " ON CONFLICT (document_id, page_number)"
+                    " DO UPDATE SET page_number = excluded.page_number"
+                    " RETURNING id",
+                    (document_id, page_number),
+                ).fetchone()
+                self._connection.execute(
+                    "DELETE FROM page_text WHERE rowid = ?", (page_id,)
+                )
+                self._connection.execute(
+                    "INSERT INTO page_text (rowid, text) VALUES (?, ?)",
+                    (page_id, text),
+                )
+
+    def _match(self, expression: str) -> set[int]:
+        return {
+            document_id
+            for (document_id,) in self._connection.execute(
+                "SELECT DISTINCT pages.document_id FROM page_text"
+                " JOIN pages ON pages.id = page_text.rowid"
+                " WHERE page_text MATCH ?",
+                (expression,),
+            )
+        }
+
+    def _candidates(self, node: QueryNode) -> set[int] | None:
+        # Documents that may match, None standing for all of them. Every run
+        # of word characters of a term is looked up on its own, since a phrase
+        # may be split between two pages, and the matches are checked again.
+        if isinstance(node, Term):
+            candidates = None
+            for piece in WORD_PIECE.findall(" ".join(node.words)):
+                if len(piece) < TRIGRAM_MIN_CHARS:
+                    continue
+                documents = self._match(f'"{piece}"')
+                candidates = documents if candidates is None else candidates & documents
+            return candidates
+        children = [self._candidates(child) for child in node.children]
+        if isinstance(node, And):
+            known = [child for child in children if child is not None]
+            return set.intersection(*known) if known else None
+        if any(child is None for child in children):
+            return None
+        return set.union(*children)
+
+    def search(self, query: CompiledQuery, piece: str | None = None) -> dict[str, dict]:
+        # Same shape as the processes of a run, for the ProcessesPage.
+        start = time.perf_counter()
+        with self._lock:
+            candidates = self._candidates(query.tree)
+            documents = self._connection.execute(
+                "SELECT id, file_path, process_number, complete FROM documents"
+                " WHERE ? IS NULL OR piece = ?",
+                (piece, piece),
+            ).fetchall()
+            processes: dict[str, dict] = {}
+            partial = 0
+            for document_id, file_path, process_number, complete in documents:
+                if candidates is not None and document_id not in candidates:
+                    continue
+                partial += not complete
+                matcher = PatternMatcher(query)
+                for page_number, text in self._connection.execute(
+                    "SELECT pages.page_number, page_text.text FROM pages"
+                    " JOIN page_text ON page_text.rowid = pages.id"
+                    " WHERE pages.document_id = ? ORDER BY pages.page_number",
+                    (document_id,),
+                ):
+                    if matcher.feed(page_number, PageRecords.from_text(text)):
+                        break
+                if not matcher.finish():
+                    continue
+                process = processes.setdefault(
+                    process_number, {"files": [], "hit_pages": {}}
+                )
+                process["files"].append(file_path)
+                process["hit_pages"][file_path] = matcher.hit.page_number
+        logger.info(
+            "Index search for %r: %d of %d documents matched in %.3f s,"
+            " %d candidates only partly indexed",
+            query.query_string,
+            sum(len(process["files"]) for process in processes.values()),
+            len(documents),
+            time.perf_counter() - start,
+            partial,
+        )
+        return processes
+
+    def log_stats(self) -> None:
+        with self._lock:
+            (documents,) = self._connection.execute(
+                "SELECT COUNT(*) FROM documents"
+            ).fetchone()
+            (pages,) = self._connection.execute("SELECT COUNT(*) FROM pages").fetchone()
+        logger.info("Text index: %d documents, %d pages", documents, pages)
+
+
+_index: TextIndex | None = None
+
+
+def get_text_index() -> TextIndex:
+    global _index
+    if _index is None:
+        _index = TextIndex()
+    return _index
+
+
+if __name__ == "__main__":
+    piece = sys.argv[2] if len(sys.argv) > 2 else None
+    for process_number, process in (
+        get_text_index().search(compile_query(sys.argv[1]), piece).items()
+    ):
+        for file_path in process["files"]:
+            print(process_number, file_path, process["hit_pages"][file_path])
@@ -1,41 +1,170 @@
 import re
+from functools import lru_cache
 
-DECOUPLE_PARENTHESES = re.compile(r"(\S*)(\(|\))(\S*)")
-WORD = re.compile(r"\w+", re.UNICODE)
-ALL = r"[\s\S]*"
-
-
-async def convert_pattern_to_regex(query_string: str) -> re.Pattern:
-    rgx = r""
-    query_string = DECOUPLE_PARENTHESES.sub(r"\1 \2 \3", query_string)
-
-    for token in query_string.split():
-        token = token.strip().lower()
-        if token.startswith("*"):
-            token = f"{ALL}{token[1:]}"
-        elif token.endswith("*"):
-            token = f"{token[:-1]}{ALL}"
-        elif token == "e":
-            token = ""
-        elif token == "ou":
-            token = "|"
-
-        if (
-            not rgx.endswith((ALL, "|", "("))
-            and not token.startswith(ALL)
-            and token != "|"
-        ):
-            rgx += ALL + token
-        else:
-            rgx += token
+from src.aho_corasick import SEPARATOR, AhoCorasick
+from src.ocr_records import FoldedText, OcrDocument, OcrHit, PageRecords, fold_text
+from src.query_language import Term, parse_query
+
+QUERY_CACHE_SIZE = 64
+AUTOMATON_MIN_TERMS = 120
+
+
+def term_words(term: Term) -> list[str]:
+    # Like the regular expressions used before, words match anywhere and a *
+    # only marks that the word may go on.
+    return [word.strip("*") for word in term.words if word.strip("*")]
+
+
+def term_pattern(term: Term) -> str:
+    return SEPARATOR.join(term_words(term))
+
+
+def term_regex(term: Term) -> re.Pattern:
+    # Same matches as term_pattern in the automaton: the words of a phrase
+    # may be split by any whitespace, line breaks included.
+    return re.compile(r"\s+".join(re.escape(word) for word in term_words(term)))
+
+
+class CompiledQuery:
+    def __init__(self, query_string: str):
+        self.query_string = query_string
+        # Text is searched folded, so the query is folded the same way.
+        self.tree = parse_query(fold_text(query_string))
+        self.terms = list(dict.fromkeys(self.tree.terms()))
+        patterns = [term_pattern(term) for term in self.terms]
+        # A lone * is in every text.
+        self.always_found = {
+            term for term, pattern in zip(self.terms, patterns) if not pattern
+        }
+        self.regexes = {term: term_regex(term) for term in self.terms}
+        self.automaton = AhoCorasick(patterns)
+        # The automaton finds all the terms in one pass, but its loop runs in
+        # Python at about 6 MB/s whatever the number of terms, while every
+        # term is a C substring scan taking about 3 ms per 2 MB. On 2 MB of
+        # text a 6 term query takes 0.01 s with regexes and 0.36 s with the
+        # automaton, which only wins from about 120 terms (0.29 s against
+        # 0.32 s at 100 terms, 0.59 s against 0.31 s at 250). Typical queries,
+        # such as the 6 term one in __main__ below, stay on the regexes.
+        # Measured with python -m src.benchmark queries.
+        self.use_automaton = len(self.terms) >= AUTOMATON_MIN_TERMS
+
+    def scan_automaton(self, text: str, found: set[Term]) -> int | None:
+        for offset, index in self.automaton.scan(text):
+            term = self.terms[index]
+            if term in found:
+                continue
+            found.add(term)
+            if self.tree.evaluate(found.__contains__):
+                return offset
+        return None
+
+    def scan_regexes(
+        self, text: str, found: set[Term], lazy: bool = False
+    ) -> int | None:
+        # Lazy scans only look for the terms the evaluation gets to, which is
+        # only right when the text is all there is to search.
+        offsets: list[int] = []
+
+        def is_present(term: Term) -> bool:
+            if term in found:
+                return True
+            match = self.regexes[term].search(text)
+            if match is None:
+                return False
+            found.add(term)
+            offsets.append(match.end() - 1)
+            return True
+
+        if lazy:
+            return min(offsets) if self.tree.evaluate(is_present) else None
+        for term in self.terms:
+            if is_present(term) and self.tree.evaluate(found.__contains__):
+                return offsets[-1] if offsets else 0
+        return None
 
-    return re.compile(rgx, re.IGNORECASE | re.UNICODE | re.MULTILINE)
+    def scan(self, text: str, found: set[Term]) -> int | None:
+        # Adds the terms in the folded text to found, stopping as soon as the
+        # query is satisfied, and then returns where.
+        if self.tree.evaluate(found.__contains__):
+            return 0
+        if self.use_automaton:
+            return self.scan_automaton(text, found)
+        return self.scan_regexes(text, found)
+
+    def search(self, text: str) -> int | None:
+        found = set(self.always_found)
+        if self.tree.evaluate(found.__contains__):
+            return 0
+        text = fold_text(text)
+        if self.use_automaton:
+            return self.scan_automaton(text, found)
+        return self.scan_regexes(text, found, lazy=True)
+
+    def matches(self, text: str) -> bool:
+        return self.search(text) is not None
+
+
+def normalize_query(query_string: str) -> str:
+    spaced = fold_text(query_string).replace("(", " ( ").replace(")", " ) ")
+    return " ".join(spaced.split())
+
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def compile_normalized_query(query_string: str) -> CompiledQuery:
+    return CompiledQuery(query_string)
+
+
+def compile_query(query_string: str) -> CompiledQuery:
+    # Queries differing only in case, accents or spacing share the compiled
+    # query.
+    return compile_normalized_query(normalize_query(query_string))
+
+
+class PatternMatcher:
+    def __init__(self, query: CompiledQuery):
+        self.query = query
+        self.pages: dict[int, PageRecords] = {}
+        self.folded: dict[int, FoldedText] = {}
+        self.found: set[Term] = set(query.always_found)
+        self.hit: OcrHit | None = None
+
+    @property
+    def matched(self) -> bool:
+        return self.hit is not None
+
+    def feed(self, page_number: int, page: PageRecords) -> bool:
+        # There is no negation, so once a term is found on any page it stays
+        # found, and a page completing the query decides it.
+        self.pages[page_number] = page
+        folded = self.folded[page_number] = FoldedText.fold(page.text)
+        if not self.matched:
+            offset = self.query.scan(folded.text, self.found)
+            if offset is not None:
+                hit_page = OcrDocument([(page_number, page)])
+                self.hit = hit_page.locate(folded.original_offset(offset))
+        return self.matched
+
+    def finish(self) -> bool:
+        # Only a phrase can span two pages, so the whole document is only
+        # scanned again when a phrase is still missing.
+        if self.matched or all(
+            len(term.words) == 1 or term in self.found for term in self.query.terms
+        ):
+            return self.matched
+        document = OcrDocument(self.pages.items())
+        # The pages were folded as they came, only the joints are new.
+        document.folded = FoldedText.join(
+            [self.folded[int(page_number)] for page_number in document.page_numbers],
+            map(int, document.page_starts),
+        )
+        offset = self.query.scan(document.folded.text, self.found)
+        if offset is not None:
+            self.hit = document.locate(document.folded.original_offset(offset))
+        return self.matched
 
 
 async def find_pattern_in_text(text: str, pattern: str) -> bool:
-    compiled_pattern = await convert_pattern_to_regex(pattern)
-    matches = compiled_pattern.findall(text)
-    return len(matches) > 0
+    return compile_query(pattern).matches(text)
 
 
 if __name__ == "__main__":
@@ -45,4 +174,4 @@ if __name__ == "__main__":
         "junho e (dois mil e dezenove OU 2019) E (alva* OU MONIK)",
     ]
     for pattern in patterns:
-        print(convert_pattern_to_regex(pattern))
+        print(compile_query(pattern).tree)